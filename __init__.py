@@ -9,6 +9,7 @@ bl_info = {
 }
 
 import bpy
+from . import animation_edits
 from . import properties
 from . import operators
 from . import ui
@@ -16,6 +17,7 @@ from . import ghosting
 from . import timeline
 
 def register():
+    animation_edits.register()
     properties.register()
     operators.register()
     ui.register()
@@ -28,6 +30,7 @@ def unregister():
     ui.unregister()
     operators.unregister()
     properties.unregister()
+    animation_edits.unregister()
 
 if __name__ == "__main__":
     register()
@@ -0,0 +1,67 @@
+"""Animation edits, tracked once for the ghosts and the Dope Sheet HUD.
+
+A single depsgraph handler counts action and object updates, undo/redo and file
+loads. Caches built from actions or objects keep the revisions they were built at
+and compare them, instead of each watching the depsgraph.
+"""
+import bpy
+import numpy as np
+
+# Bumped on every action or object update, and when undo/redo or a file load rebuilt the data
+_revision = 0
+# Revision of the last edit of each action: { action pointer: revision }
+_action_revisions = {}
+# Bumped by undo/redo and file loads: datablocks were rebuilt and their pointers may be reused
+_epoch = 0
+
+
+def revision():
+    """Changes whenever an action or an object is edited"""
+    return _revision
+
+def epoch():
+    """Changes whenever action and object pointers may have been reused (undo/redo, file load)"""
+    return _epoch
+
+def action_revision(action):
+    """Changes whenever `action` is edited (or pointers may have been reused)"""
+    return (_epoch, _action_revisions.get(action.as_pointer(), 0))
+
+def keyframe_co(fcurve):
+    """(frame, value) of every keyframe of `fcurve` as a (N, 2) float32 array, read with foreach_get"""
+    co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get("co", co)
+    return co.reshape(-1, 2)
+
+@bpy.app.handlers.persistent
+def track_edits(scene, depsgraph):
+    global _revision
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Action):
+            _revision += 1
+            _action_revisions[update.id.original.as_pointer()] = _revision
+        elif isinstance(update.id, bpy.types.Object):
+            _revision += 1
+
+@bpy.app.handlers.persistent
+def reset_edits(*args):
+    """Undo/redo and file loads rebuild the actions (and may reuse their pointers)"""
+    global _revision, _epoch
+    _revision += 1
+    _epoch += 1
+    _action_revisions.clear()
+
+def register():
+    if track_edits not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(track_edits)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+        if reset_edits not in handlers:
+            handlers.append(reset_edits)
+
+def unregister():
+    if track_edits in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(track_edits)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+        if reset_edits in handlers:
+            handlers.remove(reset_edits)
+    _action_revisions.clear()
@@ -0,0 +1,217 @@
+"""Parallel ghost baking in background Blender processes.
+
+The main session saves a copy of the current file, splits the frame range into
+contiguous chunks and starts one `blender -b` per chunk with this file as its
+--python script. Each worker evaluates its frames and writes raw positions,
+normals and topology into its own temp folder (a disk_cache.GhostStore).
+The main session then uploads them into GHOST_CACHE.
+
+Only absolute imports at module level: this file also runs as __main__ inside
+the workers, where it is not part of the addon package.
+"""
+import bpy
+import importlib
+import importlib.util
+import json
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Starting a Blender process costs a few seconds, not worth it for short ranges
+MIN_FRAMES_PER_WORKER = 16
+WORKER_PACKAGE = "animah_bake_worker"
+
+
+# ---------------------------------------------------------------------------
+# Main session side
+# ---------------------------------------------------------------------------
+
+def split_frames(frames, count):
+    """Split frames into `count` contiguous chunks (keeps rig evaluation and topology local)"""
+    size, extra = divmod(len(frames), count)
+    chunks = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(frames[start:end])
+        start = end
+    return chunks
+
+def bake_in_workers(context, obj, frames, worker_count):
+    """Bake `frames` of `obj` in `worker_count` background Blender processes.
+
+    Returns the set of frames that were delivered and stored in GHOST_CACHE. Anything
+    missing (worker crashed, Blender binary unavailable...) is left for the caller to
+    bake in-process.
+    """
+    from . import ghosting
+
+    if not bpy.app.binary_path:
+        print("Animah: Blender binary not found, baking in-process")
+        return set()
+
+    settings = context.scene.animah_settings
+    work_dir = tempfile.mkdtemp(prefix="animah_bake_")
+    delivered = set()
+    wm = context.window_manager
+
+    try:
+        # Workers read the current state, including unsaved edits
+        blend_path = os.path.join(work_dir, "scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True, check_existing=False)
+
+        # Every worker reduces its frames with the same proxy topology
+        lod_path = None
+        lod = ghosting.get_lod_map(context, obj)
+        if lod is not None:
+            lod_path = os.path.join(work_dir, "lod.npz")
+            np.savez(lod_path, clusters=lod['clusters'], counts=lod['counts'], tris=lod['tris'], edges=lod['edges'])
+
+        procs = []
+        for i, chunk in enumerate(split_frames(frames, worker_count)):
+            out_dir = os.path.join(work_dir, f"worker_{i}")
+            os.makedirs(out_dir)
+            job_path = os.path.join(out_dir, "job.json")
+            with open(job_path, 'w') as f:
+                json.dump({
+                    'addon_dir': os.path.dirname(os.path.abspath(__file__)),
+                    'scene': context.scene.name,
+                    'view_layer': context.view_layer.name,
+                    'object': obj.name,
+                    'frames': chunk,
+                    'scope': settings.ghost_bake_scope,
+                    'lod': lod_path,
+                }, f)
+
+            cmd = [bpy.app.binary_path, "-b", "--factory-startup"]
+            if context.preferences.filepaths.use_scripts_auto_execute:
+                # Drivers with Python expressions should behave like in the main session
+                cmd.append("--enable-autoexec")
+            cmd += [blend_path, "--python", os.path.abspath(__file__), "--", job_path]
+            procs.append((subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE), out_dir))
+
+        print(f"Animah: baking {len(frames)} frames in {len(procs)} background workers...")
+        wm.progress_begin(0, len(procs))
+        for done, (proc, out_dir) in enumerate(procs, 1):
+            _, err = proc.communicate()
+            if proc.returncode != 0:
+                print(f"Animah: bake worker failed ({proc.returncode}):\n{err.decode(errors='replace')[-2000:]}")
+            else:
+                delivered |= load_worker_output(out_dir, obj, settings)
+            wm.progress_update(done)
+
+        ghosting.enforce_memory_budget(settings, ghosting.pinned_entries(context))
+    except Exception as e:
+        # Anything goes wrong -> the in-process bake picks up the rest
+        print(f"Animah: parallel bake failed: {e}")
+    finally:
+        wm.progress_end()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return delivered
+
+def load_worker_output(out_dir, obj, settings):
+    """Upload one worker's frames into GHOST_CACHE, returns the frames stored"""
+    from . import ghosting
+    from . import disk_cache
+
+    result = disk_cache.GhostStore(out_dir)
+    if not os.path.exists(os.path.join(out_dir, disk_cache.INDEX_NAME)):
+        return set()
+
+    # Keep the persistent cache in sync with what the workers baked
+    persistent = None
+    if settings.ghost_disk_cache:
+        persistent = disk_cache.open_object_store(obj)
+    if persistent is not None:
+        base_hash = disk_cache.mesh_hash(obj, settings.ghost_lod_ratio)
+        if persistent.mesh_hash != base_hash:
+            persistent.reset(base_hash)
+        hashes = disk_cache.frame_hashes(obj, result.frames(), base_hash)
+
+    delivered = set()
+    geometry_keys = {}
+    persistent_ids = {}
+    for frame in result.frames():
+        matrix = result.frame_matrix(frame)
+        geo_id = result.frame_geometry(frame)
+        if geo_id in geometry_keys:
+            # Rigid frames reuse the shape the worker extracted once
+            ghosting.store_entry(obj.name, frame, matrix, geometry_keys[geo_id])
+        else:
+            arrays = result.load_geometry(geo_id, mmap=False)
+            geometry_keys[geo_id] = ghosting.add_baked_frame(
+                obj.name, frame, matrix, *arrays, settings.ghost_compact, lazy=settings.ghost_instanced)
+            if persistent is not None:
+                persistent_ids[geo_id] = persistent.add_geometry(*arrays)
+        if persistent is not None:
+            persistent.add_frame(frame, matrix, persistent_ids[geo_id], hashes[frame])
+        delivered.add(frame)
+
+    if persistent is not None:
+        persistent.save()
+    return delivered
+
+
+# ---------------------------------------------------------------------------
+# Worker side (runs inside `blender -b file.blend --python bake_worker.py -- job.json`)
+# ---------------------------------------------------------------------------
+
+def import_addon_module(addon_dir, name):
+    """Import an addon submodule without registering the addon, whatever its install location"""
+    if WORKER_PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            WORKER_PACKAGE, os.path.join(addon_dir, "__init__.py"),
+            submodule_search_locations=[addon_dir])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[WORKER_PACKAGE] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f"{WORKER_PACKAGE}.{name}")
+
+def run_worker(job_path):
+    with open(job_path) as f:
+        job = json.load(f)
+    ghosting = import_addon_module(job['addon_dir'], "ghosting")
+    disk_cache = import_addon_module(job['addon_dir'], "disk_cache")
+
+    scene = bpy.data.scenes[job['scene']]
+    view_layer = scene.view_layers[job['view_layer']]
+    obj = bpy.data.objects[job['object']]
+
+    # Output uses the same layout as the on-disk ghost cache
+    store = disk_cache.GhostStore(os.path.dirname(job_path))
+    rigid = ghosting.is_rigid(obj)
+    rigid_geometry = None
+    lod = dict(np.load(job['lod'])) if job.get('lod') else None
+
+    with ghosting.frame_evaluator(scene, view_layer, obj, job['scope']) as evaluate:
+        for frame in job['frames']:
+            eval_obj = evaluate(frame)
+            matrix = eval_obj.matrix_world.copy()
+
+            if rigid_geometry is not None:
+                store.add_frame(frame, matrix, rigid_geometry)
+                continue
+
+            mesh = eval_obj.to_mesh()
+            if mesh:
+                arrays = ghosting.extract_mesh_arrays(mesh)
+                if lod is not None and len(arrays[0]) == len(lod['clusters']):
+                    arrays = ghosting.apply_lod(lod, arrays[0], arrays[1])
+                geo_id = store.add_geometry(*arrays)
+                store.add_frame(frame, matrix, geo_id)
+                if rigid:
+                    rigid_geometry = geo_id
+
+            eval_obj.to_mesh_clear()
+
+    # The index is written last: its presence means the worker finished
+    store.save()
+
+
+if __name__ == "__main__":
+    run_worker(sys.argv[sys.argv.index("--") + 1])
@@ -0,0 +1,319 @@
+"""Animah benchmark suite, headless and reproducible.
+
+    blender -b --factory-startup --python benchmarks/run_benchmarks.py -- [options]
+
+    --sizes small,medium        scene sizes to run (see SIZES)
+    --repeat 5                  timed runs per case, the median is reported
+    --output results.json       where to write the results
+    --baseline baselines.json   stored baselines to compare against
+    --update-baseline           write this run's results as the new baselines
+    --threshold 0.25            allowed slowdown / memory growth over the baseline
+
+Every size builds a synthetic scene from scratch: a subdivided grid skinned to an
+animated two-bone rig, with polish tracks and items added through the real operator.
+Each case records its median wall time and its peak memory: Python and NumPy
+allocations (tracemalloc, measured in an extra untimed run) and the process peak RSS.
+Cases that change the scene rebuild it before every run, outside the timing.
+The exit code is 1 when a case is slower or bigger than baseline * (1 + threshold).
+
+Runs on a CPU-only box: without a GPU context the real bake runs with its GPU
+buffer creation stubbed out (see stub_gpu_uploads), so the draw plan is built
+over the baked entries. GPU draws are never issued.
+"""
+import bpy
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "animah_benchmark"
+
+# grid: vertices per side, frames: scene length, tracks x items: polish items
+SIZES = {
+    'small': {'grid': 32, 'frames': 48, 'tracks': 2, 'items': 8},
+    'medium': {'grid': 128, 'frames': 120, 'tracks': 4, 'items': 40},
+    'large': {'grid': 384, 'frames': 240, 'tracks': 8, 'items': 200},
+}
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="run_benchmarks.py")
+    parser.add_argument("--sizes", default="small,medium")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(ROOT, "benchmarks", "baselines.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+def load_addon():
+    """Import and register the addon from this checkout, whatever its install location"""
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+    spec.loader.exec_module(package)
+    package.register()
+    return (importlib.import_module(f"{PACKAGE}.ghosting"),
+            importlib.import_module(f"{PACKAGE}.timeline"))
+
+def stub_gpu_uploads(ghosting):
+    """Bake without a GPU: index and vertex buffers are skipped, everything else runs as is"""
+    def get_topology(vert_count, tri_indices, edge_indices):
+        key = ghosting.topology_fingerprint(vert_count, tri_indices, edge_indices)
+        topology = ghosting.GHOST_TOPOLOGY.setdefault(key, {'tris': None, 'lines': None, 'nbytes': 0, 'users': 0})
+        return key, topology
+
+    def build_frame_batches(positions, normals, topology, vert_format=None):
+        return None, None
+
+    ghosting.get_topology = get_topology
+    ghosting.build_frame_batches = build_frame_batches
+
+def gpu_available():
+    try:
+        import gpu
+        vert_format = gpu.types.GPUVertFormat()
+        vert_format.attr_add(id="pos", comp_type='F32', len=3, fetch_mode='FLOAT')
+        gpu.types.GPUVertBuf(vert_format, 1)
+        return True
+    except Exception:
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Synthetic scene
+# ---------------------------------------------------------------------------
+
+def build_scene(size):
+    """Grid skinned to an animated two-bone rig, in an emptied scene. Returns the mesh object"""
+    # Emptied by hand: reloading the startup file would drop the registered addon
+    for collection in (bpy.data.objects, bpy.data.meshes, bpy.data.armatures, bpy.data.actions):
+        for datablock in list(collection):
+            collection.remove(datablock)
+    scene = bpy.context.scene
+    scene.frame_start = 1
+    scene.frame_end = size['frames']
+    view_layer = bpy.context.view_layer
+
+    armature = bpy.data.armatures.new("BenchRig")
+    rig = bpy.data.objects.new("BenchRig", armature)
+    scene.collection.objects.link(rig)
+    view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    root = armature.edit_bones.new("root")
+    root.head, root.tail = (0.0, -1.0, 0.0), (0.0, 0.0, 0.0)
+    tip = armature.edit_bones.new("tip")
+    tip.head, tip.tail = (0.0, 0.0, 0.0), (0.0, 1.0, 0.0)
+    tip.parent = root
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    # Swing the tip bone back and forth
+    bone = rig.pose.bones["tip"]
+    bone.rotation_mode = 'XYZ'
+    for frame in range(1, size['frames'] + 1, 12):
+        bone.rotation_euler = (0.0, 0.0, 0.6 if (frame // 12) % 2 else -0.6)
+        bone.keyframe_insert("rotation_euler", frame=frame)
+
+    n = size['grid'] - 1
+    bpy.ops.mesh.primitive_grid_add(x_subdivisions=n, y_subdivisions=n, size=2.0)
+    obj = bpy.context.active_object
+    obj.name = "BenchMesh"
+    groups = {name: obj.vertex_groups.new(name=name) for name in ("root", "tip")}
+    root_verts = [v.index for v in obj.data.vertices if v.co.y < 0.0]
+    tip_verts = [v.index for v in obj.data.vertices if v.co.y >= 0.0]
+    groups["root"].add(root_verts, 1.0, 'REPLACE')
+    groups["tip"].add(tip_verts, 1.0, 'REPLACE')
+    modifier = obj.modifiers.new("Armature", 'ARMATURE')
+    modifier.object = rig
+    view_layer.objects.active = obj
+    return obj
+
+def add_polish_items(obj, tracks, items):
+    """Add `tracks` tracks of `items` polish items through the real operator, spread over the range"""
+    scene = bpy.context.scene
+    span = max(scene.frame_end - scene.frame_start, 1)
+    for _ in range(tracks):
+        bpy.ops.animah.add_track()
+        obj.animah_active_track_index = len(obj.animah_tracks) - 1
+        for i in range(items):
+            scene.frame_set(scene.frame_start + (i * span) // max(items, 1))
+            bpy.ops.animah.add_polish_frame()
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+def case_bake(ghosting, obj):
+    """Full-range bake, the cache it leaves is used by the draw plan cases"""
+    context = bpy.context
+
+    def run():
+        ghosting.bake_ghosts_to_memory(context)
+    return run
+
+def case_draw_plan(ghosting, obj):
+    """Build the draw plan from scratch on every frame of the range"""
+    context = bpy.context
+    scene = context.scene
+    frames = list(range(scene.frame_start, scene.frame_end + 1))
+
+    def run():
+        for f in frames:
+            scene.frame_current = f
+            ghosting.bump_settings_revision()
+            ghosting.get_draw_plan(context)
+    return run
+
+def case_draw_plan_cached(ghosting, obj):
+    """Ask for the same plan repeatedly, as every viewport redraw does"""
+    context = bpy.context
+
+    def run():
+        for _ in range(1000):
+            ghosting.get_draw_plan(context)
+    return run
+
+def case_sync_list(timeline, obj):
+    scene = bpy.context.scene
+    frames = list(range(scene.frame_start, scene.frame_end + 1))
+
+    def run():
+        for f in frames:
+            scene.frame_current = f
+            timeline.sync_list_to_timeline(scene)
+    return run
+
+def case_hud_frame_data(timeline, obj):
+    settings = bpy.context.scene.animah_settings
+
+    def run():
+        for track in obj.animah_tracks:
+            timeline.compute_frame_data(obj, track, settings.neighbor_range)
+    return run
+
+def case_add_polish_frame(size):
+    """Add a track of polish items. Returns (setup, run): every run gets a freshly built scene"""
+    scene_state = {}
+
+    def setup():
+        scene_state['obj'] = build_scene(size)
+        add_polish_items(scene_state['obj'], size['tracks'], size['items'])
+
+    def run():
+        add_polish_items(scene_state['obj'], 1, size['items'])
+    return setup, run
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def measure(run, repeat, setup=None):
+    """Median time of `repeat` runs, `setup` (untimed) runs before each of them"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    # Separate run: tracing allocations slows Python code down
+    if setup:
+        setup()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'time_s': statistics.median(times),
+        'min_time_s': min(times),
+        'py_peak_mb': peak / (1024 * 1024),
+        # Linux reports ru_maxrss in KB
+        'rss_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def run_size(name, size, repeat, ghosting, timeline):
+    obj = build_scene(size)
+    add_polish_items(obj, size['tracks'], size['items'])
+    bpy.context.scene.frame_set(bpy.context.scene.frame_start)
+
+    results = {}
+    def run_case(case, run, setup=None):
+        print(f"  {name}/{case}...", flush=True)
+        results[case] = measure(run, repeat, setup)
+
+    run_case("bake", case_bake(ghosting, obj))
+    run_case("draw_plan", case_draw_plan(ghosting, obj))
+    run_case("draw_plan_cached", case_draw_plan_cached(ghosting, obj))
+    run_case("sync_list_to_timeline", case_sync_list(timeline, obj))
+    run_case("hud_frame_data", case_hud_frame_data(timeline, obj))
+    ghosting.clear_cache()
+    # Last: it rebuilds the scene
+    setup, run = case_add_polish_frame(size)
+    run_case("add_polish_frame", run, setup)
+    return results
+
+def compare(results, baselines, threshold):
+    """Print every case against its baseline, returns the list of regressions"""
+    regressions = []
+    for size, cases in results.items():
+        for case, r in cases.items():
+            base = baselines.get(size, {}).get(case)
+            if base is None:
+                print(f"{size}/{case}: {r['time_s'] * 1000:.2f} ms, {r['py_peak_mb']:.1f} MB (no baseline)")
+                continue
+            time_ratio = r['time_s'] / max(base['time_s'], 1e-9)
+            mem_ratio = r['py_peak_mb'] / max(base['py_peak_mb'], 1e-3)
+            failed = time_ratio > 1.0 + threshold or mem_ratio > 1.0 + threshold
+            print(f"{size}/{case}: {r['time_s'] * 1000:.2f} ms ({time_ratio:.2f}x), "
+                  f"{r['py_peak_mb']:.1f} MB ({mem_ratio:.2f}x){'  REGRESSION' if failed else ''}")
+            if failed:
+                regressions.append(f"{size}/{case}")
+    return regressions
+
+def main():
+    args = parse_args()
+    ghosting, timeline = load_addon()
+    has_gpu = gpu_available()
+    print(f"Animah benchmarks, Blender {bpy.app.version_string}, GPU {'available' if has_gpu else 'unavailable'}")
+    if not has_gpu:
+        stub_gpu_uploads(ghosting)
+
+    results = {}
+    for name in args.sizes.split(","):
+        results[name] = run_size(name, SIZES[name], args.repeat, ghosting, timeline)
+
+    with open(args.output, 'w') as f:
+        json.dump({'blender': bpy.app.version_string, 'gpu': has_gpu, 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baselines updated: {args.baseline}")
+        return
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""On-disk ghost frames.
+
+A GhostStore is a folder of raw .npy arrays plus an index.json:
+
+    frames:   { frame: {'matrix': [16 floats], 'geometry': id, 'hash': str} }
+    geometry: { id: {'topology': id, 'positions': file, 'normals': file} }
+    topology: { id: {'tris': file, 'edges': file, 'fingerprint': [...]} }
+    next_id:  counter the geometry and topology ids are numbered from
+
+The same layout is used for the persistent sidecar cache next to the .blend
+(one store per object) and for the output of background bake workers.
+"""
+import bpy
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+from array import array
+from mathutils import Matrix
+
+INDEX_NAME = "index.json"
+
+
+class GhostStore:
+    """Folder of baked frames, see module docstring for the layout"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.index = {'mesh_hash': None, 'frames': {}, 'geometry': {}, 'topology': {}, 'next_id': 0}
+        self._topology_ids = {}
+
+        path = os.path.join(folder, INDEX_NAME)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Animah: ignoring unreadable ghost cache {path}: {e}")
+        for topo_id, topo in self.index['topology'].items():
+            self._topology_ids[tuple(topo['fingerprint'])] = topo_id
+        if 'next_id' not in self.index:
+            # Older index: continue after the highest id in use
+            ids = list(self.index['geometry']) + list(self.index['topology'])
+            self.index['next_id'] = max((int(i[1:].rstrip("_")) + 1 for i in ids), default=0)
+
+    @property
+    def mesh_hash(self):
+        return self.index['mesh_hash']
+
+    def reset(self, mesh_hash=None):
+        """Forget everything (e.g. the base mesh changed)"""
+        from . import ghosting
+        
+        # Cached ghosts may still memory map the arrays about to be deleted
+        ghosting.release_store(self.folder)
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.index = {'mesh_hash': mesh_hash, 'frames': {}, 'geometry': {}, 'topology': {},
+                      'next_id': self.index['next_id']}
+        self._topology_ids = {}
+    
+    def _new_id(self, prefix):
+        """Never reused, even once save() pruned the entry: its file may still be memory mapped"""
+        new_id = f"{prefix}{self.index['next_id']}"
+        self.index['next_id'] += 1
+        return new_id
+
+    def _save_array(self, name, data):
+        os.makedirs(self.folder, exist_ok=True)
+        np.save(os.path.join(self.folder, name), data)
+        return name
+
+    def _load_array(self, name, mmap):
+        return np.load(os.path.join(self.folder, name), mmap_mode='r' if mmap else None)
+
+    def add_geometry(self, positions, normals, tri_indices, edge_indices):
+        """Write one evaluated shape, returns its geometry id. Topology is written once per fingerprint"""
+        from . import ghosting
+
+        fingerprint = ghosting.topology_fingerprint(len(positions), tri_indices, edge_indices)
+        topo_id = self._topology_ids.get(fingerprint)
+        if topo_id is None:
+            topo_id = self._new_id("t")
+            self.index['topology'][topo_id] = {
+                'tris': self._save_array(f"{topo_id}_tris.npy", tri_indices),
+                'edges': self._save_array(f"{topo_id}_edges.npy", edge_indices),
+                'fingerprint': list(fingerprint),
+            }
+            self._topology_ids[fingerprint] = topo_id
+
+        geo_id = self._new_id("g")
+        self.index['geometry'][geo_id] = {
+            'topology': topo_id,
+            'positions': self._save_array(f"{geo_id}_pos.npy", positions),
+            'normals': self._save_array(f"{geo_id}_nrm.npy", normals),
+        }
+        return geo_id
+
+    def add_frame(self, frame, matrix, geo_id, frame_hash=None):
+        self.index['frames'][str(frame)] = {
+            'matrix': [v for row in matrix for v in row],
+            'geometry': geo_id,
+            'hash': frame_hash,
+        }
+
+    def frames(self):
+        return [int(f) for f in self.index['frames']]
+
+    def frame_hash(self, frame):
+        info = self.index['frames'].get(str(frame))
+        return info['hash'] if info else None
+
+    def frame_matrix(self, frame):
+        m = self.index['frames'][str(frame)]['matrix']
+        return Matrix((m[0:4], m[4:8], m[8:12], m[12:16]))
+
+    def frame_geometry(self, frame):
+        return self.index['frames'][str(frame)]['geometry']
+
+    def load_geometry(self, geo_id, mmap=True):
+        """(positions, normals, tri_indices, edge_indices), memory mapped by default"""
+        geo = self.index['geometry'][geo_id]
+        topo = self.index['topology'][geo['topology']]
+        return (
+            self._load_array(geo['positions'], mmap),
+            self._load_array(geo['normals'], mmap),
+            self._load_array(topo['tris'], mmap),
+            self._load_array(topo['edges'], mmap),
+        )
+
+    def save(self):
+        """Write the index, deleting files no frame refers to anymore"""
+        used_geo = {info['geometry'] for info in self.index['frames'].values()}
+        for geo_id in [g for g in self.index['geometry'] if g not in used_geo]:
+            geo = self.index['geometry'].pop(geo_id)
+            for name in (geo['positions'], geo['normals']):
+                _remove(os.path.join(self.folder, name))
+
+        used_topo = {geo['topology'] for geo in self.index['geometry'].values()}
+        for topo_id in [t for t in self.index['topology'] if t not in used_topo]:
+            topo = self.index['topology'].pop(topo_id)
+            self._topology_ids.pop(tuple(topo['fingerprint']), None)
+            for name in (topo['tris'], topo['edges']):
+                _remove(os.path.join(self.folder, name))
+
+        # Written last and atomically: a complete index means complete arrays
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = os.path.join(self.folder, INDEX_NAME + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, os.path.join(self.folder, INDEX_NAME))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Persistent sidecar cache
+# ---------------------------------------------------------------------------
+
+def sidecar_folder():
+    """<blend folder>/<blend name>.animah_ghosts, or None for an unsaved file"""
+    if not bpy.data.filepath:
+        return None
+    stem = os.path.splitext(bpy.path.basename(bpy.data.filepath))[0]
+    return os.path.join(os.path.dirname(bpy.data.filepath), f"{stem}.animah_ghosts")
+
+def open_object_store(obj):
+    folder = sidecar_folder()
+    if folder is None:
+        return None
+    return GhostStore(os.path.join(folder, bpy.path.clean_name(obj.name)))
+
+def rna_settings(struct, skip=()):
+    """Every plain setting of an RNA struct (e.g. a modifier), pointers by the name they point to.
+    Settings whose data path is in `skip` (e.g. animated ones) are left out"""
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+            continue
+        if skip and struct.path_from_id(prop.identifier) in skip:
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'POINTER':
+            value = getattr(value, 'name', None)
+        elif getattr(prop, 'is_array', False):
+            value = tuple(value)
+        values.append((prop.identifier, value))
+    return values
+
+def mesh_hash(obj, lod_ratio=1.0):
+    """Content hash of what every frame is built from: base mesh, topology,
+    reference shape key, the modifier stack with its settings and the ghost detail ratio"""
+    mesh = obj.data
+    h = hashlib.blake2b(digest_size=16)
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    h.update(co.tobytes())
+
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
+    h.update(loops.tobytes())
+
+    if mesh.shape_keys:
+        mesh.shape_keys.reference_key.data.foreach_get("co", co)
+        h.update(co.tobytes())
+
+    # Animated settings change with the frame, frame_hashes covers them
+    animated = set()
+    if obj.animation_data:
+        if obj.animation_data.action:
+            animated.update(fc.data_path for fc in obj.animation_data.action.fcurves)
+        animated.update(fc.data_path for fc in obj.animation_data.drivers)
+    h.update(repr([rna_settings(m, animated) for m in obj.modifiers]).encode())
+    if lod_ratio < 1.0:
+        h.update(f"lod{lod_ratio:.4f}".encode())
+    return h.hexdigest()
+
+def shape_key_hashes(obj):
+    """{ shape key name: content hash } for the non-reference shape keys"""
+    key = obj.data.shape_keys
+    if not key:
+        return {}
+    co = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+    hashes = {}
+    for kb in key.key_blocks:
+        if kb == key.reference_key:
+            continue
+        kb.data.foreach_get("co", co)
+        hashes[kb.name] = hashlib.blake2b(co.tobytes(), digest_size=16).digest()
+    return hashes
+
+def animation_actions(obj):
+    """Actions that drive the ghosted shape: object action, shape-key action and rig actions"""
+    owners = [obj, obj.data.shape_keys]
+    rigs = {m.object for m in obj.modifiers if m.type == 'ARMATURE' and m.object}
+    if obj.parent and obj.parent.type == 'ARMATURE':
+        rigs.add(obj.parent)
+    owners += sorted(rigs, key=lambda r: r.name)
+
+    actions = []
+    for owner in owners:
+        if owner and owner.animation_data and owner.animation_data.action:
+            actions.append(owner.animation_data.action)
+    return actions
+
+def animation_fcurves(obj):
+    """F-Curves of every action in animation_actions"""
+    return [fc for action in animation_actions(obj) for fc in action.fcurves]
+
+def frame_hashes(obj, frames, base_hash):
+    """Per-frame content hash: mesh hash + every driving F-Curve evaluated at that frame
+    + the shapes and influences of the shape keys active on that frame.
+
+    Editing a key or sculpting a polish shape only changes the hashes of the frames
+    it actually affects.
+    """
+    fcurves = animation_fcurves(obj)
+    layout = "|".join(f"{fc.data_path}[{fc.array_index}]" for fc in fcurves)
+    seed = hashlib.blake2b(f"{base_hash}|{layout}".encode(), digest_size=16)
+
+    # Shape key influence per frame: its F-Curve if animated, its static value otherwise
+    key_hashes = shape_key_hashes(obj)
+    key_curves = []
+    key = obj.data.shape_keys
+    action = key.animation_data.action if key and key.animation_data else None
+    for name, content in key_hashes.items():
+        kb = key.key_blocks[name]
+        if kb.mute:
+            continue
+        fcurve = action.fcurves.find(f'key_blocks["{name}"].value') if action else None
+        key_curves.append((content, fcurve, kb.value))
+
+    hashes = {}
+    for f in frames:
+        h = seed.copy()
+        h.update(array('d', (fc.evaluate(f) for fc in fcurves)).tobytes())
+        for content, fcurve, value in key_curves:
+            influence = fcurve.evaluate(f) if fcurve else value
+            if influence != 0.0:
+                h.update(content)
+                h.update(array('d', (influence,)).tobytes())
+        hashes[f] = h.hexdigest()
+    return hashes
@@ -2,9 +2,59 @@ import bpy
 import gpu
 from gpu_extras.batch import batch_for_shader
 import bgl
+import numpy as np
+import bisect
+import zlib
+import hashlib
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from . import animation_edits
+from . import bake_worker
+from . import disk_cache
+from . import profiling
 
-# Global Cache: { frame_number: {'batch': batch, 'matrix': matrix} }
-GHOST_CACHE = {}
+# Global Cache: { (object_name, frame_number): {'matrix': matrix, 'geometry': key} }
+# Ordered least-recently-drawn first (across all objects), so eviction pops from the front.
+GHOST_CACHE = OrderedDict()
+# Uploaded shapes, shared by every frame where the evaluated mesh is identical (e.g. rigid motion):
+# { fingerprint: {'batch': batch, 'batch_wire': batch, 'topology': key, 'compact': bool, 'nbytes': int, 'users': int} }
+GHOST_GEOMETRY = {}
+# Index buffers shared by every frame with the same topology:
+# { fingerprint: {'tris': ibo, 'lines': ibo, 'nbytes': int, 'users': int} }
+GHOST_TOPOLOGY = {}
+# Per-topology textures holding the shapes being drawn, read by the instanced renderer:
+# { topology fingerprint: {'texture', 'framebuffer', 'capacity', 'slots': {geometry key: slot}, 'version',
+#   'batch', 'batch_wire', 'nbytes'} }
+GHOST_ATLAS = {}
+# Motion trails: { object_name: { frame: (points, 3) world positions } }
+GHOST_TRAILS = {}
+# Points each trail follows, kept so stale frames are re-baked with the same points:
+# { object_name: (tracked_points result, base mesh vertex count) }
+GHOST_TRAIL_POINTS = {}
+# (object_name, frame) entries made stale by an edit, re-baked by bake_ghosts_to_memory(only_dirty=True)
+GHOST_DIRTY = set()
+# (object_name, frame) motion trail samples made stale by an edit, same as GHOST_DIRTY for GHOST_TRAILS
+GHOST_TRAIL_DIRTY = set()
+# (object_name, frame) entries dropped to stay inside the memory budget, re-baked when needed again
+GHOST_EVICTED = set()
+# Bytes held by GHOST_GEOMETRY + GHOST_TOPOLOGY + GHOST_ATLAS
+_cache_bytes = 0
+_vert_format = None
+_compact_vert_format = None
+_index_vert_format = None
+_is_baking = False
+# Revisions of GHOST_CACHE and of the ghost settings and pins. Together with the
+# animation edit revision they key the cached draw plan, see get_draw_plan
+_cache_revision = 0
+_settings_revision = 0
+_draw_plan = None
+# (frames done, frames total) of the running time-sliced bake, None when idle
+_bake_progress = None
+# Names of the objects with Pin Ghosts on, kept by update_pinned. None until scanned
+_pinned_names = None
+# animation_edits.epoch() of the last scan: undo and file loads restore pins without the callback
+_pinned_epoch = None
 _handler = None
 _shader = None
 
@@ -18,36 +68,202 @@ def get_shader():
             _shader = gpu.shader.from_builtin('3D_UNIFORM_COLOR')
     return _shader
 
-def clear_cache():
-    global GHOST_CACHE
-    GHOST_CACHE.clear()
+def clear_cache(owner=None):
+    """Forget every baked ghost, or only those of the object named `owner`"""
+    global GHOST_CACHE, _cache_bytes
+    if owner is None:
+        _cache_bytes = 0
+        GHOST_CACHE.clear()
+        GHOST_GEOMETRY.clear()
+        GHOST_TOPOLOGY.clear()
+        GHOST_ATLAS.clear()
+        GHOST_DIRTY.clear()
+        GHOST_TRAILS.clear()
+        GHOST_TRAIL_POINTS.clear()
+        GHOST_TRAIL_DIRTY.clear()
+        _keyed_frames.clear()
+        _lod_maps.clear()
+        bump_cache_revision()
+        GHOST_EVICTED.clear()
+    else:
+        for key in [k for k in GHOST_CACHE if k[0] == owner]:
+            drop_entry(*key)
+        _lod_maps.pop(owner, None)
+        if GHOST_TRAILS.pop(owner, None) is not None:
+            bump_cache_revision()
+        GHOST_TRAIL_POINTS.pop(owner, None)
+        GHOST_TRAIL_DIRTY.difference_update([k for k in GHOST_TRAIL_DIRTY if k[0] == owner])
+        GHOST_EVICTED.difference_update([k for k in GHOST_EVICTED if k[0] == owner])
     if bpy.context.area:
         bpy.context.area.tag_redraw()
 
-_lit_shader = None
-def get_lit_shader():
-    global _lit_shader
-    if not _lit_shader:
+def cached_frames(owner):
+    """Frames baked for the object named `owner`"""
+    return [f for name, f in GHOST_CACHE if name == owner]
+
+def ghost_objects(context):
+    """Objects whose ghosts are baked and drawn: the active mesh plus every visible pinned mesh"""
+    objects = []
+    active = context.active_object
+    if active and active.type == 'MESH':
+        objects.append(active)
+    view_layer = context.view_layer
+    for obj in pinned_objects():
+        if obj.type == 'MESH' and obj != active and obj.visible_get(view_layer=view_layer):
+            objects.append(obj)
+    return objects
+
+def pinned_objects():
+    """Objects with Pin Ghosts on, resolved by name instead of scanning the scene"""
+    if _pinned_names is None or _pinned_epoch != animation_edits.epoch():
+        rescan_pinned()
+    objects = [bpy.data.objects.get(name) for name in sorted(_pinned_names)]
+    if any(obj is None or not obj.animah_ghost_pinned for obj in objects):
+        # Renamed, deleted or unpinned without the update callback (e.g. undo)
+        rescan_pinned()
+        objects = [bpy.data.objects.get(name) for name in sorted(_pinned_names)]
+    return objects
+
+def rescan_pinned():
+    global _pinned_names, _pinned_epoch
+    _pinned_names = {obj.name for obj in bpy.data.objects if obj.animah_ghost_pinned}
+    _pinned_epoch = animation_edits.epoch()
+
+def update_pinned(self, context):
+    """Pin Ghosts toggled on object `self`"""
+    if _pinned_names is not None:
+        if self.animah_ghost_pinned:
+            _pinned_names.add(self.name)
+        else:
+            _pinned_names.discard(self.name)
+    update_ghosts(self, context)
+
+def pinned_entries(context, objects=None):
+    """(object_name, frame) keys the ghosts show around the playhead right now, never evicted"""
+    pinned = set()
+    settings = context.scene.animah_settings
+    for obj in objects if objects is not None else ghost_objects(context):
+        prev_frames, next_frames = get_ghost_frames(obj, context.scene.frame_current, settings)
+        pinned.update((obj.name, f) for f in prev_frames + next_frames)
+    return pinned
+
+_lit_shaders = {}
+def get_lit_shader(compact=False):
+    """Shaded ghost shader. The `compact` variant decodes packed frames (see pack_frame)
+    and can also draw them flat (lighting = 0) for Silhouette/Wireframe."""
+    shader = _lit_shaders.get(compact)
+    if not shader:
+        if compact:
+            vertex_shader = '''
+                in vec4 pos;     // 16-bit unorm, quantized to the frame's bounding box
+                in vec2 normal;  // 16-bit snorm, octahedral encoded
+                uniform mat4 ModelViewProjectionMatrix;
+                uniform mat3 NormalMatrix;
+                uniform vec4 color;
+                uniform vec3 bboxMin;
+                uniform vec3 bboxSize;
+                uniform float lighting;
+                out vec4 f_color;
+                
+                vec3 oct_decode(vec2 e) {
+                    vec3 n = vec3(e.xy, 1.0 - abs(e.x) - abs(e.y));
+                    float t = max(-n.z, 0.0);
+                    n.x += n.x >= 0.0 ? -t : t;
+                    n.y += n.y >= 0.0 ? -t : t;
+                    return normalize(n);
+                }
+                
+                void main() {
+                    vec3 co = bboxMin + pos.xyz * bboxSize;
+                    vec3 view_normal = normalize(NormalMatrix * oct_decode(normal));
+                    vec3 light_dir = normalize(vec3(0.5, 0.5, 1.0)); // Fixed light from camera-ish
+                    float diff = max(dot(view_normal, light_dir), 0.0);
+                    float ambient = 0.3;
+                    
+                    vec3 lit_col = color.rgb * mix(1.0, diff + ambient, lighting);
+                    
+                    gl_Position = ModelViewProjectionMatrix * vec4(co, 1.0);
+                    f_color = vec4(lit_col, color.a);
+                }
+            '''
+        else:
+            vertex_shader = '''
+                in vec3 pos;
+                in vec3 normal;
+                uniform mat4 ModelViewProjectionMatrix;
+                uniform mat3 NormalMatrix;
+                uniform vec4 color;
+                out vec4 f_color;
+                
+                void main() {
+                    vec3 view_normal = normalize(NormalMatrix * normal);
+                    vec3 light_dir = normalize(vec3(0.5, 0.5, 1.0)); // Fixed light from camera-ish
+                    float diff = max(dot(view_normal, light_dir), 0.0);
+                    float ambient = 0.3;
+                    
+                    vec3 lit_col = color.rgb * (diff + ambient);
+                    
+                    gl_Position = ModelViewProjectionMatrix * vec4(pos, 1.0);
+                    f_color = vec4(lit_col, color.a);
+                }
+            '''
+        fragment_shader = '''
+            in vec4 f_color;
+            out vec4 fragColor;
+            void main() {
+                fragColor = f_color;
+            }
+        '''
+        # The builtin matrix uniforms are filled from gpu.matrix on every draw
+        shader = gpu.types.GPUShader(vertex_shader, fragment_shader)
+        _lit_shaders[compact] = shader
+    return shader
+
+# Ghosts per instanced draw call, sized so the instance block stays far below the 16 KB UBO minimum
+MAX_INSTANCES = 64
+_instanced_shader = None
+def get_instanced_shader():
+    """Instanced ghost shader: vertices come from a topology atlas (see update_atlas),
+    matrix, color and atlas slot of each ghost from the GhostInstances uniform block."""
+    global _instanced_shader
+    if not _instanced_shader:
         vertex_shader = '''
-            in vec3 pos;
-            in vec3 normal;
-            uniform mat4 viewProjectionMatrix;
-            uniform mat4 modelMatrix;
-            uniform vec4 color;
+            in int vid;
+            uniform mat4 ModelViewProjectionMatrix;
+            uniform mat3 NormalMatrix;
+            uniform sampler2D atlas;
+            uniform int vertCount;
+            uniform float lighting;
+            layout(std140) uniform GhostInstances {
+                mat4 ghost_model[%(count)d];
+                vec4 ghost_color[%(count)d];
+                vec4 ghost_slot[%(count)d];  // x: atlas slot
+            };
             out vec4 f_color;
             
+            vec4 fetch(int texel) {
+                int width = textureSize(atlas, 0).x;
+                return texelFetch(atlas, ivec2(texel %% width, texel / width), 0);
+            }
+            
             void main() {
-                vec3 world_normal = normalize(mat3(modelMatrix) * normal);
+                int texel = (int(ghost_slot[gl_InstanceID].x) * vertCount + vid) * 2;
+                vec3 co = fetch(texel).xyz;
+                vec3 normal = fetch(texel + 1).xyz;
+                mat4 model = ghost_model[gl_InstanceID];
+                vec4 color = ghost_color[gl_InstanceID];
+                
+                vec3 view_normal = normalize(NormalMatrix * (mat3(model) * normal));
                 vec3 light_dir = normalize(vec3(0.5, 0.5, 1.0)); // Fixed light from camera-ish
-                float diff = max(dot(world_normal, light_dir), 0.0);
+                float diff = max(dot(view_normal, light_dir), 0.0);
                 float ambient = 0.3;
                 
-                vec3 lit_col = color.rgb * (diff + ambient);
+                vec3 lit_col = color.rgb * mix(1.0, diff + ambient, lighting);
                 
-                gl_Position = viewProjectionMatrix * modelMatrix * vec4(pos, 1.0);
+                gl_Position = ModelViewProjectionMatrix * (model * vec4(co, 1.0));
                 f_color = vec4(lit_col, color.a);
             }
-        '''
+        ''' % {'count': MAX_INSTANCES}
         fragment_shader = '''
             in vec4 f_color;
             out vec4 fragColor;
@@ -55,130 +271,1340 @@ def get_lit_shader():
                 fragColor = f_color;
             }
         '''
-        _lit_shader = gpu.types.GPUShader(vertex_shader, fragment_shader)
-    return _lit_shader
+        _instanced_shader = gpu.types.GPUShader(vertex_shader, fragment_shader)
+    return _instanced_shader
 
 
-def bake_ghosts_to_memory(context):
-    """Bake evaluated meshes to GPU batches for the entire range"""
-    clear_cache()
+def extract_mesh_arrays(mesh):
+    """Copy positions, normals and topology of a mesh into contiguous NumPy buffers.
+
+    Everything goes through foreach_get so no per-vertex Python objects are created.
+    Returns (positions, normals, tri_indices, edge_indices) shaped (N, 3), (N, 3), (T, 3), (E, 2).
+    """
+    # We need loop triangles for drawing
+    mesh.calc_loop_triangles()
+
+    vert_count = len(mesh.vertices)
+    positions = np.empty(vert_count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", positions)
+
+    # Note: mesh.vertices[i].normal is the vertex normal, used by the Lit shader
+    normals = np.empty(vert_count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("normal", normals)
+
+    tri_indices = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tri_indices)
+
+    # Wireframe draws the real mesh edges rather than the triangulation
+    edge_indices = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edge_indices)
+
+    return (
+        positions.reshape(-1, 3),
+        normals.reshape(-1, 3),
+        tri_indices.reshape(-1, 3),
+        edge_indices.reshape(-1, 2),
+    )
+
+
+def get_vert_format():
+    """Vertex layout of a ghost frame: position + normal (what the Lit shader reads)"""
+    global _vert_format
+    if not _vert_format:
+        _vert_format = gpu.types.GPUVertFormat()
+        _vert_format.attr_add(id="pos", comp_type='F32', len=3, fetch_mode='FLOAT')
+        _vert_format.attr_add(id="normal", comp_type='F32', len=3, fetch_mode='FLOAT')
+    return _vert_format
+
+def get_compact_vert_format():
+    """Packed layout: 4 x uint16 position (w unused, keeps 4-byte alignment) + 2 x int16 octahedral normal"""
+    global _compact_vert_format
+    if not _compact_vert_format:
+        _compact_vert_format = gpu.types.GPUVertFormat()
+        _compact_vert_format.attr_add(id="pos", comp_type='U16', len=4, fetch_mode='INT_TO_FLOAT_UNIT')
+        _compact_vert_format.attr_add(id="normal", comp_type='I16', len=2, fetch_mode='INT_TO_FLOAT_UNIT')
+    return _compact_vert_format
+
+def get_index_vert_format():
+    """Instanced layout: only the vertex index, positions and normals are fetched from the atlas"""
+    global _index_vert_format
+    if not _index_vert_format:
+        _index_vert_format = gpu.types.GPUVertFormat()
+        _index_vert_format.attr_add(id="vid", comp_type='I32', len=1, fetch_mode='INT')
+    return _index_vert_format
+
+def octahedral_encode(normals):
+    """Map unit normals (N, 3) onto the octahedron, as int16 snorm (N, 2)"""
+    n = normals / np.maximum(np.abs(normals).sum(axis=1, keepdims=True), 1e-12)
+    encoded = n[:, :2].copy()
+    lower = n[:, 2] < 0.0
+    xy = n[lower, :2]
+    encoded[lower] = (1.0 - np.abs(xy[:, ::-1])) * np.where(xy >= 0.0, 1.0, -1.0)
+    return np.round(np.clip(encoded, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+def pack_frame(positions, normals):
+    """Quantize positions to 16 bits inside the frame's bounding box and octahedral-encode normals.
     
-    scene = context.scene
-    obj = context.active_object
-    if not obj or obj.type != 'MESH':
+    Returns (packed_positions, packed_normals, bbox_min, bbox_size), decoded by get_lit_shader(compact=True).
+    12 bytes per vertex instead of 24.
+    """
+    if len(positions):
+        bbox_min = positions.min(axis=0)
+        bbox_size = positions.max(axis=0) - bbox_min
+    else:
+        bbox_min = np.zeros(3, dtype=np.float32)
+        bbox_size = np.zeros(3, dtype=np.float32)
+    # Flat axes would divide by zero
+    bbox_size[bbox_size <= 0.0] = 1.0
+    
+    packed_positions = np.zeros((len(positions), 4), dtype=np.uint16)
+    packed_positions[:, :3] = np.round((positions - bbox_min) / bbox_size * 65535.0)
+    return packed_positions, octahedral_encode(normals), tuple(bbox_min), tuple(bbox_size)
+
+def topology_fingerprint(vert_count, tri_indices, edge_indices):
+    """Cheap key identifying a topology: element counts plus a CRC of a strided index sample"""
+    tri_step = max(1, len(tri_indices) // 1024)
+    edge_step = max(1, len(edge_indices) // 1024)
+    crc = zlib.crc32(np.ascontiguousarray(tri_indices[::tri_step]).tobytes())
+    crc = zlib.crc32(np.ascontiguousarray(edge_indices[::edge_step]).tobytes(), crc)
+    return (vert_count, len(edge_indices), len(tri_indices), crc)
+
+def get_topology(vert_count, tri_indices, edge_indices):
+    """Return the fingerprint and the (possibly shared) index buffers for this topology.
+
+    A deforming character keeps the same topology for the whole shot, so every frame
+    reuses one TRIS and one LINES index buffer. Remesh/boolean modifiers produce new
+    fingerprints and therefore get their own buffers.
+    """
+    global _cache_bytes
+    key = topology_fingerprint(vert_count, tri_indices, edge_indices)
+    topology = GHOST_TOPOLOGY.get(key)
+    if topology is None:
+        topology = {
+            'tris': gpu.types.GPUIndexBuf(type='TRIS', seq=tri_indices),
+            'lines': gpu.types.GPUIndexBuf(type='LINES', seq=edge_indices),
+            'nbytes': tri_indices.nbytes + edge_indices.nbytes,
+            'users': 0,
+        }
+        GHOST_TOPOLOGY[key] = topology
+        _cache_bytes += topology['nbytes']
+    return key, topology
+
+def geometry_fingerprint(topology_key, compact, positions, normals):
+    """Key identifying one evaluated shape, so frames where the mesh did not change share it"""
+    digest = hashlib.blake2b(positions.tobytes(), digest_size=16)
+    digest.update(normals.tobytes())
+    return (topology_key, compact, digest.digest())
+
+def get_geometry(positions, normals, tri_indices, edge_indices, compact, key=None, lazy=False):
+    """Return the key of the (possibly shared) GPU geometry for this evaluated mesh.
+    
+    Frames whose mesh is unchanged (rigid motion, holds) reuse one vertex buffer
+    and only store their own matrix. `key` skips content hashing when the caller
+    already identifies the shape (e.g. a disk cache id). With `lazy` the arrays are
+    kept (typically memory mapped) and only uploaded the first time they are drawn.
+    """
+    global _cache_bytes
+    # Only positions and normals are uploaded per shape,
+    # index buffers come from the shared topology.
+    topology_key, topology = get_topology(len(positions), tri_indices, edge_indices)
+    if key is None:
+        key = geometry_fingerprint(topology_key, compact, positions, normals)
+    if key in GHOST_GEOMETRY:
+        return key
+        
+    geometry = {'topology': topology_key, 'compact': compact, 'users': 0, 'batch': None, 'batch_wire': None}
+    if lazy:
+        # Held as given (float32 even for compact ghosts) until uploaded
+        geometry['arrays'] = (positions, normals)
+        geometry['nbytes'] = positions.nbytes + normals.nbytes
+    else:
+        geometry['nbytes'] = uploaded_nbytes(len(positions), compact)
+        upload_geometry(geometry, positions, normals)
+    
+    GHOST_GEOMETRY[key] = geometry
+    topology['users'] += 1
+    _cache_bytes += geometry['nbytes']
+    return key
+
+def uploaded_nbytes(vert_count, compact):
+    """GPU bytes of a shape's vertex buffer: packed layout is 12 bytes per vertex, float layout 24"""
+    return vert_count * (12 if compact else 24)
+
+def upload_geometry(geometry, positions=None, normals=None):
+    """Create the GPU batches of a geometry (from its deferred arrays if none are given)"""
+    global _cache_bytes
+    if positions is None:
+        positions, normals = geometry.pop('arrays')
+        # The CPU arrays are dropped, only the vertex buffer is left
+        nbytes = uploaded_nbytes(len(positions), geometry['compact'])
+        _cache_bytes += nbytes - geometry['nbytes']
+        geometry['nbytes'] = nbytes
+    if geometry['compact']:
+        positions, normals, geometry['bbox_min'], geometry['bbox_size'] = pack_frame(positions, normals)
+        vert_format = get_compact_vert_format()
+    else:
+        vert_format = get_vert_format()
+    topology = GHOST_TOPOLOGY[geometry['topology']]
+    geometry['batch'], geometry['batch_wire'] = build_frame_batches(positions, normals, topology, vert_format)
+
+def release_geometry(key):
+    """Drop one user of a geometry, freeing it (and then its topology) once unused"""
+    global _cache_bytes
+    geometry = GHOST_GEOMETRY.get(key)
+    if geometry is None:
+        return
+    geometry['users'] -= 1
+    if geometry['users'] > 0:
+        return
+    del GHOST_GEOMETRY[key]
+    _cache_bytes -= geometry['nbytes']
+    
+    # Its atlas slot is free for the next shape drawn
+    atlas = GHOST_ATLAS.get(geometry['topology'])
+    if atlas is not None:
+        atlas['slots'].pop(key, None)
+    
+    topology = GHOST_TOPOLOGY.get(geometry['topology'])
+    if topology is not None:
+        topology['users'] -= 1
+        if topology['users'] <= 0:
+            del GHOST_TOPOLOGY[geometry['topology']]
+            _cache_bytes -= topology['nbytes']
+            # Nothing of this topology is left to draw, free its texture too
+            release_atlas(geometry['topology'])
+
+def is_baking():
+    """True while frames are being evaluated: frame changes then come from the bake, not the user"""
+    return _is_baking
+
+def release_store(folder):
+    """Drop the cached frames whose arrays are still memory mapped from the disk store in
+    `folder`, before its files are deleted. They are marked stale to be re-baked."""
+    keys = {k for k, g in GHOST_GEOMETRY.items() if k[0] == 'disk' and k[1] == folder and 'arrays' in g}
+    if not keys:
+        return
+    stale = [k for k, e in GHOST_CACHE.items() if e['geometry'] in keys or e.get('detail') in keys]
+    for key in stale:
+        drop_entry(*key)
+    GHOST_DIRTY.update(stale)
+    schedule_dirty_rebake()
+
+def bake_progress():
+    return _bake_progress
+
+def set_bake_progress(progress):
+    global _bake_progress
+    _bake_progress = progress
+
+def bump_cache_revision():
+    global _cache_revision
+    _cache_revision += 1
+
+def bump_settings_revision():
+    global _settings_revision
+    _settings_revision += 1
+
+def store_entry(owner, frame, matrix, geometry_key):
+    """Add (or replace) a cached frame of object `owner`, keeping geometry users and the byte count in sync"""
+    # Count the new user first so replacing a frame never frees the geometry it still uses
+    GHOST_GEOMETRY[geometry_key]['users'] += 1
+    drop_entry(owner, frame)
+    GHOST_CACHE[(owner, frame)] = {'matrix': matrix, 'geometry': geometry_key}
+    GHOST_EVICTED.discard((owner, frame))
+    bump_cache_revision()
+
+def drop_entry(owner, frame):
+    """Remove a cached frame, freeing its geometry once no frame uses it anymore"""
+    entry = GHOST_CACHE.pop((owner, frame), None)
+    if entry is None:
+        return
+    bump_cache_revision()
+    GHOST_DIRTY.discard((owner, frame))
+    release_geometry(entry['geometry'])
+    if 'detail' in entry:
+        release_geometry(entry['detail'])
+
+def attach_detail(owner, frame, geometry_key):
+    """Give a cached (reduced) frame a full-detail shape, drawn instead of it"""
+    entry = GHOST_CACHE[(owner, frame)]
+    GHOST_GEOMETRY[geometry_key]['users'] += 1
+    if 'detail' in entry:
+        release_geometry(entry['detail'])
+    entry['detail'] = geometry_key
+    bump_cache_revision()
+
+def release_details(keep):
+    """Free the full-detail shapes of every cached frame not in `keep`"""
+    for key, entry in GHOST_CACHE.items():
+        if 'detail' in entry and key not in keep:
+            release_geometry(entry.pop('detail'))
+            bump_cache_revision()
+
+def cache_size_bytes():
+    return _cache_bytes
+
+def enforce_memory_budget(settings, pinned):
+    """Evict least-recently-drawn frames until the cache fits in the memory budget.
+    
+    Entries in `pinned` (the ones around the playhead) are never evicted.
+    """
+    budget = settings.ghost_memory_budget * 1024 * 1024
+    if budget <= 0 or _cache_bytes <= budget:
         return
         
-    start = scene.frame_start
-    end = scene.frame_end
+    for key in [k for k in GHOST_CACHE if k not in pinned]:
+        drop_entry(*key)
+        GHOST_EVICTED.add(key)
+        if _cache_bytes <= budget:
+            break
+
+def build_frame_batches(positions, normals, topology, vert_format=None):
+    """Upload one frame's vertex buffer and wrap it in solid and wire batches.
+
+    Both batches draw the same vertex buffer, only the index buffer differs.
+    """
+    with profiling.measure("bake.gpu_upload"):
+        vbo = gpu.types.GPUVertBuf(vert_format or get_vert_format(), len(positions))
+        vbo.attr_fill("pos", positions)
+        vbo.attr_fill("normal", normals)
+    with profiling.measure("bake.batch_creation"):
+        batch = gpu.types.GPUBatch(type='TRIS', buf=vbo, elem=topology['tris'])
+        batch_wire = gpu.types.GPUBatch(type='LINES', buf=vbo, elem=topology['lines'])
+    return batch, batch_wire
+
+# Texels per atlas row
+ATLAS_WIDTH = 4096
+# Shapes an atlas holds at least. It only holds the shapes being drawn, and grows
+# (is recreated) when a plan group needs more slots than it has
+ATLAS_MIN_SLOTS = 16
+
+_atlas_write_shader = None
+def get_atlas_write_shader():
+    """Writes values into atlas texels: one point per texel, rendered into the atlas framebuffer"""
+    global _atlas_write_shader
+    if not _atlas_write_shader:
+        vertex_shader = '''
+            in vec3 value;
+            in int texel;
+            uniform ivec2 atlasSize;
+            out vec4 f_value;
+            
+            void main() {
+                vec2 co = (vec2(texel % atlasSize.x, texel / atlasSize.x) + 0.5) / vec2(atlasSize);
+                gl_Position = vec4(co * 2.0 - 1.0, 0.0, 1.0);
+                f_value = vec4(value, 0.0);
+            }
+        '''
+        fragment_shader = '''
+            in vec4 f_value;
+            out vec4 fragColor;
+            void main() {
+                fragColor = f_value;
+            }
+        '''
+        _atlas_write_shader = gpu.types.GPUShader(vertex_shader, fragment_shader)
+    return _atlas_write_shader
+
+_atlas_write_format = None
+def get_atlas_write_format():
+    """Layout of an atlas write: the value of a texel and the texel index"""
+    global _atlas_write_format
+    if not _atlas_write_format:
+        _atlas_write_format = gpu.types.GPUVertFormat()
+        _atlas_write_format.attr_add(id="value", comp_type='F32', len=3, fetch_mode='FLOAT')
+        _atlas_write_format.attr_add(id="texel", comp_type='I32', len=1, fetch_mode='INT')
+    return _atlas_write_format
+
+def create_atlas(topology_key, capacity):
+    """Empty RGBA32F texture with `capacity` slots for shapes of a topology (position texel
+    + normal texel per vertex), read by the instanced renderer.
     
-    print(f"Baking Ghosts to GPU Memory from {start} to {end}...")
+    Returns None if it does not fit the GPU's largest texture.
+    """
+    global _cache_bytes
+    release_atlas(topology_key)
+    vert_count = topology_key[0]
+    height = -(-capacity * vert_count * 2 // ATLAS_WIDTH)
+    if not vert_count or height > gpu.capabilities.max_texture_size_get():
+        return None
+    texture = gpu.types.GPUTexture((ATLAS_WIDTH, height), format='RGBA32F')
     
-    # Store state
-    original_frame = scene.frame_current
+    vbo = gpu.types.GPUVertBuf(get_index_vert_format(), vert_count)
+    vbo.attr_fill("vid", np.arange(vert_count, dtype=np.int32))
+    topology = GHOST_TOPOLOGY[topology_key]
+    atlas = {
+        'texture': texture,
+        'framebuffer': gpu.types.GPUFrameBuffer(color_slots=texture),
+        'capacity': capacity,
+        # { geometry key: slot }, least recently drawn first
+        'slots': OrderedDict(),
+        # Bumped when slots are (re)assigned, the instance blocks refer to them
+        'version': 0,
+        'batch': gpu.types.GPUBatch(type='TRIS', buf=vbo, elem=topology['tris']),
+        'batch_wire': gpu.types.GPUBatch(type='LINES', buf=vbo, elem=topology['lines']),
+        'nbytes': ATLAS_WIDTH * height * 16 + vert_count * 4,
+    }
+    GHOST_ATLAS[topology_key] = atlas
+    _cache_bytes += atlas['nbytes']
+    return atlas
+
+def write_atlas_slot(atlas, slot, positions, normals):
+    """Write one shape into an atlas slot, the rest of the texture is left untouched"""
+    vert_count = len(positions)
+    values = np.empty((vert_count * 2, 3), dtype=np.float32)
+    values[0::2] = positions
+    values[1::2] = normals
+    vbo = gpu.types.GPUVertBuf(get_atlas_write_format(), len(values))
+    vbo.attr_fill("value", values)
+    vbo.attr_fill("texel", np.arange(slot * vert_count * 2, (slot + 1) * vert_count * 2, dtype=np.int32))
+    batch = gpu.types.GPUBatch(type='POINTS', buf=vbo)
     
-    try:
-        for f in range(start, end + 1):
-            scene.frame_set(f)
-            depsgraph = context.evaluated_depsgraph_get()
-            eval_obj = obj.evaluated_get(depsgraph)
-            mesh = eval_obj.to_mesh()
+    texture = atlas['texture']
+    shader = get_atlas_write_shader()
+    blend = gpu.state.blend_get()
+    gpu.state.blend_set('NONE')
+    gpu.state.point_size_set(1.0)
+    with atlas['framebuffer'].bind():
+        atlas['framebuffer'].viewport_set(0, 0, texture.width, texture.height)
+        shader.bind()
+        shader.uniform_int("atlasSize", (texture.width, texture.height))
+        batch.draw(shader)
+    gpu.state.blend_set(blend)
+
+def update_atlas(topology_key, keys):
+    """Atlas holding the shapes `keys` (the ghosts of a plan group sharing a topology).
+    
+    Missing shapes are written into free slots, or into the slots of the shapes drawn
+    least recently, without re-uploading the others. Returns None if the shapes do not
+    fit the GPU's largest texture.
+    """
+    keys = list(dict.fromkeys(keys))
+    atlas = GHOST_ATLAS.get(topology_key)
+    if atlas is None or atlas['capacity'] < len(keys):
+        capacity = max(ATLAS_MIN_SLOTS, 1 << (len(keys) - 1).bit_length())
+        atlas = create_atlas(topology_key, capacity)
+        if atlas is None:
+            return None
             
-            if mesh:
-                # Extract coords and indices
-                # We need loop triangles for drawing
-                mesh.calc_loop_triangles()
-                # Ensure normals are calculated for 'SOLID' mode
-                pass
+    slots = atlas['slots']
+    missing = [key for key in keys if key not in slots]
+    if missing:
+        used = set(slots.values())
+        free = [slot for slot in range(atlas['capacity']) if slot not in used]
+        wanted = set(keys)
+        reusable = (key for key in list(slots) if key not in wanted)
+        for key in missing:
+            if not free:
+                free.append(slots.pop(next(reusable)))
+            slot = free.pop()
+            write_atlas_slot(atlas, slot, *GHOST_GEOMETRY[key]['arrays'])
+            slots[key] = slot
+        atlas['version'] += 1
+    for key in keys:
+        slots.move_to_end(key)
+    return atlas
 
+def release_atlas(topology_key):
+    global _cache_bytes
+    atlas = GHOST_ATLAS.pop(topology_key, None)
+    if atlas is not None:
+        _cache_bytes -= atlas['nbytes']
+
+def draw_instanced(topology_key, group, display_type):
+    """Draw all ghosts of a plan group (see get_draw_plan) sharing a topology,
+    with one draw call per MAX_INSTANCES.
+    
+    The instance blocks are kept in the group and reused until the atlas slots change.
+    Returns False (nothing drawn) if the shapes could not be packed, the caller then draws them one by one.
+    """
+    items = group['items']
+    atlas = update_atlas(topology_key, [entry['geometry'] for entry, _ in items])
+    if atlas is None:
+        return False
+            
+    if group['atlas'] is not atlas or group['atlas_version'] != atlas['version']:
+        group['atlas'] = atlas
+        group['atlas_version'] = atlas['version']
+        group['blocks'] = []
+        for start in range(0, len(items), MAX_INSTANCES):
+            chunk = items[start:start + MAX_INSTANCES]
+            # std140 block: mat4 ghost_model[N], vec4 ghost_color[N], vec4 ghost_slot[N]
+            block = np.zeros(MAX_INSTANCES * 24, dtype=np.float32)
+            models = block[:MAX_INSTANCES * 16].reshape(MAX_INSTANCES, 16)
+            colors = block[MAX_INSTANCES * 16:MAX_INSTANCES * 20].reshape(MAX_INSTANCES, 4)
+            slots = block[MAX_INSTANCES * 20:].reshape(MAX_INSTANCES, 4)
+            for i, (entry, color) in enumerate(chunk):
+                # GLSL matrices are column major
+                models[i] = np.array(entry['matrix'], dtype=np.float32).T.ravel()
+                colors[i] = color
+                slots[i, 0] = atlas['slots'][entry['geometry']]
+            group['blocks'].append((gpu.types.GPUUniformBuf(block), len(chunk)))
+            
+    shader = get_instanced_shader()
+    shader.bind()
+    shader.uniform_sampler("atlas", atlas['texture'])
+    shader.uniform_int("vertCount", topology_key[0])
+    shader.uniform_float("lighting", 1.0 if display_type == 'SOLID' else 0.0)
+    batch = atlas['batch_wire'] if display_type == 'WIRE' else atlas['batch']
+    for ubo, count in group['blocks']:
+        shader.uniform_block("GhostInstances", ubo)
+        batch.draw_instanced(shader, instance_count=count)
+    return True
+
+# Reduced proxy topology per object: { object_name: lod map (see build_lod_map) }
+_lod_maps = {}
+
+def cluster_vertices(positions, origin, cell):
+    """Cluster id of every vertex when snapping them to a grid of `cell` sized cubes"""
+    cells = np.floor((positions - origin) / cell).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, clusters = np.unique(keys, return_inverse=True)
+    return clusters.astype(np.int32).ravel()
+
+def build_lod_map(positions, tri_indices, edge_indices, ratio):
+    """Vertex clustering decimation: a grid is sized (by bisection) so about `ratio` of the
+    vertices remain, each cell becomes one proxy vertex.
+    
+    Returns {'clusters': proxy vertex of each vertex, 'counts': vertices per proxy vertex,
+    'tris', 'edges': proxy topology}, applied to every frame by apply_lod.
+    """
+    target = max(int(len(positions) * ratio), 4)
+    origin = positions.min(axis=0)
+    extent = max(float(np.ptp(positions, axis=0).max()), 1e-6)
+    small, large = extent / max(len(positions), 1), extent
+    clusters = cluster_vertices(positions, origin, large)
+    for _ in range(12):
+        cell = (small * large) ** 0.5
+        candidate = cluster_vertices(positions, origin, cell)
+        if candidate.max() + 1 > target:
+            small = cell
+        else:
+            large = cell
+            clusters = candidate
+            
+    # Drop collapsed triangles/edges and the duplicates clustering creates
+    tris = clusters[tri_indices]
+    tris = tris[(tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])]
+    edges = np.sort(clusters[edge_indices], axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return {
+        'clusters': clusters,
+        'counts': np.bincount(clusters).astype(np.float32),
+        'tris': np.ascontiguousarray(np.unique(np.sort(tris, axis=1), axis=0), dtype=np.int32),
+        'edges': np.ascontiguousarray(np.unique(edges, axis=0), dtype=np.int32),
+    }
+
+def apply_lod(lod, positions, normals):
+    """Reduce one frame to the proxy topology: each proxy vertex is the mean of its cluster.
+    Returns arrays shaped like extract_mesh_arrays"""
+    clusters = lod['clusters']
+    count = len(lod['counts'])
+    proxy_positions = np.empty((count, 3), dtype=np.float32)
+    proxy_normals = np.empty((count, 3), dtype=np.float32)
+    for axis in range(3):
+        proxy_positions[:, axis] = np.bincount(clusters, weights=positions[:, axis], minlength=count) / lod['counts']
+        proxy_normals[:, axis] = np.bincount(clusters, weights=normals[:, axis], minlength=count)
+    proxy_normals /= np.maximum(np.linalg.norm(proxy_normals, axis=1, keepdims=True), 1e-12)
+    return proxy_positions, proxy_normals, lod['tris'], lod['edges']
+
+def get_lod_map(context, obj):
+    """Proxy topology of `obj` for the current Ghost Detail, or None at full detail.
+    
+    Built once from the evaluated mesh at the current frame and reused by every
+    later bake of the object while its vertex count and the ratio stay the same.
+    """
+    ratio = context.scene.animah_settings.ghost_lod_ratio
+    if ratio >= 1.0:
+        return None
+    eval_obj = obj.evaluated_get(context.evaluated_depsgraph_get())
+    lod = _lod_maps.get(obj.name)
+    if lod is not None and lod['ratio'] == ratio and len(lod['clusters']) == len(eval_obj.data.vertices):
+        return lod
+        
+    lod = None
+    mesh = eval_obj.to_mesh()
+    if mesh and len(mesh.vertices):
+        positions, _, tri_indices, edge_indices = extract_mesh_arrays(mesh)
+        lod = build_lod_map(positions, tri_indices, edge_indices, ratio)
+    eval_obj.to_mesh_clear()
+    if lod is not None:
+        lod['ratio'] = ratio
+        _lod_maps[obj.name] = lod
+    return lod
+
+def wants_detail(settings):
+    """Full-detail shapes are kept for the nearest ghosts (only meaningful with reduced ghosts)"""
+    return settings.ghost_lod_ratio < 1.0 and settings.ghost_lod_keep_near
+
+def detail_entries(context):
+    """(object_name, frame) of the nearest previous and next ghost of every ghosted object"""
+    near = set()
+    settings = context.scene.animah_settings
+    for obj in ghost_objects(context):
+        for frames in get_ghost_frames(obj, context.scene.frame_current, settings):
+            if frames:
+                near.add((obj.name, frames[0]))
+    return near
+
+# Modifiers whose result only depends on the mesh itself, not on time or other objects
+STATIC_MODIFIERS = {'SUBSURF', 'MULTIRES', 'BEVEL', 'SOLIDIFY', 'TRIANGULATE', 'WEIGHTED_NORMAL', 'EDGE_SPLIT'}
+
+def is_rigid(obj):
+    """True if only the object transform can change over time, never the evaluated mesh"""
+    if any(mod.type not in STATIC_MODIFIERS for mod in obj.modifiers):
+        return False
+    # A deforming parent acts as a virtual modifier
+    if obj.parent and obj.parent_type in {'ARMATURE', 'LATTICE'}:
+        return False
+    anim = obj.animation_data
+    if anim and any(d.data_path.startswith("modifiers[") for d in anim.drivers):
+        return False
+    if anim and anim.action and any(fc.data_path.startswith("modifiers[") for fc in anim.action.fcurves):
+        return False
+    if obj.data.animation_data:
+        return False
+    key = obj.data.shape_keys
+    if key and key.animation_data and (key.animation_data.action or key.animation_data.drivers):
+        return False
+    return True
+
+def tag_view3d_redraw():
+    """Redraw every 3D Viewport (works from timers, where context.area is None)"""
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+@contextmanager
+def frame_evaluator(scene, view_layer, obj, scope='SCENE'):
+    """Yield an `evaluate(frame)` function returning `obj` evaluated at that frame.
+    
+    SCENE scope sets the frame on the real scene (everything gets evaluated).
+    OBJECT scope evaluates a throwaway scene that only links `obj`. The depsgraph
+    pulls in whatever the object depends on (parent, rig, constraint and driver
+    targets) even though those are not linked, so the rest of the set is skipped
+    per frame. The real scene is evaluated once more on exit, back on its own frame.
+    """
+    if scope == 'OBJECT':
+        temp_scene = bpy.data.scenes.new("Animah Ghost Bake")
+        # Time based drivers/simulations should see the same frame rate
+        temp_scene.render.fps = scene.render.fps
+        temp_scene.render.fps_base = scene.render.fps_base
+        temp_scene.collection.objects.link(obj)
+        temp_layer = temp_scene.view_layers[0]
+        # Make sure the depsgraph exists, so frame_set evaluates it
+        temp_layer.update()
+        
+        def evaluate(frame):
+            temp_scene.frame_set(frame)
+            temp_layer.update()
+            return obj.evaluated_get(temp_layer.depsgraph)
+            
+        try:
+            yield evaluate
+        finally:
+            bpy.data.scenes.remove(temp_scene)
+            # The temporary depsgraph wrote its last frame back to the original
+            # data, re-evaluate the real scene where it stands
+            scene.frame_set(scene.frame_current)
+            view_layer.update()
+    else:
+        original_frame = scene.frame_current
+        
+        def evaluate(frame):
+            scene.frame_set(frame)
+            view_layer.update()
+            return obj.evaluated_get(view_layer.depsgraph)
+            
+        try:
+            yield evaluate
+        finally:
+            scene.frame_set(original_frame)
+
+def add_baked_frame(owner, frame, matrix, positions, normals, tri_indices, edge_indices, compact, lazy=False):
+    """Upload (or reuse) the geometry of an extracted frame and cache it. Returns the geometry key.
+    
+    With `lazy` the arrays are kept for the instanced renderer instead of being uploaded.
+    """
+    geometry_key = get_geometry(positions, normals, tri_indices, edge_indices, compact, lazy=lazy)
+    store_entry(owner, frame, matrix, geometry_key)
+    return geometry_key
+
+class BakeSession:
+    """One bake job of an object (see bake_jobs), set up once and fed slices of frames.
+    
+    Holds what every slice shares: the disk store with the content hashes of all
+    the job's frames, the LOD map, the rigid shape, the trail points and the frames
+    never to evict. No datablock is kept between slices (undo and saves may happen
+    in between): the object and scene are looked up again, and the frame evaluator
+    only lives for one slice. close() saves the store once the job is done or cancelled.
+    """
+    
+    def __init__(self, context, obj, kind, frames):
+        settings = context.scene.animah_settings
+        self.owner = obj.name
+        self.kind = kind
+        self.scope = settings.ghost_bake_scope
+        self.store = None
+        if kind == 'TRAIL':
+            # Re-baked stale frames follow the points the trail was baked with, even if the
+            # selection changed since. Vertex group members are gathered in Python, once
+            tracked = GHOST_TRAIL_POINTS.get(obj.name) if obj.name in GHOST_TRAILS else None
+            if tracked is None:
+                tracked = (tracked_points(obj, settings), len(obj.data.vertices))
+                if tracked[0]:
+                    GHOST_TRAIL_POINTS[obj.name] = tracked
+            self.points, self.vert_count = tracked
+            if not self.points:
+                print(f"Animah: nothing to trail on '{obj.name}' (select vertices or pick a vertex group)")
+            return
+            
+        # Rigid fast path: the mesh is extracted once, every other frame only evaluates its matrix
+        self.compact = settings.ghost_compact
+        self.instanced = settings.ghost_instanced
+        self.rigid = is_rigid(obj)
+        self.rigid_geometry = None
+        if self.rigid:
+            self.rigid_geometry = next((e['geometry'] for k, e in GHOST_CACHE.items()
+                                        if k[0] == self.owner and GHOST_GEOMETRY[e['geometry']]['compact'] == self.compact), None)
+        
+        # Never evict what is about to be drawn (for this object or any other ghosted one)
+        self.pinned = pinned_entries(context) | pinned_entries(context, [obj])
+        
+        # Reduced ghosts: every frame only stores its proxy vertex positions
+        self.lod = get_lod_map(context, obj)
+        
+        # Persistent cache: raw arrays are written next to the .blend as they are baked
+        if settings.ghost_disk_cache:
+            self.store = disk_cache.open_object_store(obj)
+        if self.store is not None:
+            base_hash = disk_cache.mesh_hash(obj, settings.ghost_lod_ratio)
+            if self.store.mesh_hash != base_hash:
+                self.store.reset(base_hash)
+            self.hashes = disk_cache.frame_hashes(obj, frames, base_hash)
+            self.stored_geometry = {}
+            # The shared rigid shape has to be written to this store too
+            self.rigid_geometry = None
+            
+    def bake(self, context, frames):
+        """Evaluate `frames` and (re)place the results in GHOST_CACHE / GHOST_TRAILS.
+        Returns False if the object is gone."""
+        global _is_baking
+        obj = bpy.data.objects.get(self.owner)
+        if obj is None:
+            return False
+        _is_baking = True
+        try:
+            # The user's scene is put back (and a throwaway scene removed) after every slice
+            with frame_evaluator(context.scene, context.view_layer, obj, self.scope) as evaluate:
+                if self.kind != 'TRAIL':
+                    self._bake_meshes(context.scene.animah_settings, evaluate, frames)
+                elif self.points:
+                    bake_trail(obj, self.points, self.vert_count, evaluate, frames)
+        finally:
+            _is_baking = False
+            if self.kind == 'TRAIL':
+                bump_cache_revision()
+            tag_view3d_redraw()
+        return True
+            
+    def _bake_meshes(self, settings, evaluate, frames):
+        owner = self.owner
+        store = self.store
+        for f in frames:
+            with profiling.measure("bake.frame_set"):
+                eval_obj = evaluate(f)
+            
+            matrix = eval_obj.matrix_world.copy()
+            if self.rigid_geometry is not None:
+                store_entry(owner, f, matrix, self.rigid_geometry)
+                if store is not None:
+                    store.add_frame(f, matrix, self.stored_geometry[self.rigid_geometry], self.hashes[f])
+                GHOST_DIRTY.discard((owner, f))
+                continue
                 
-                vertices = [v.co for v in mesh.vertices]
-                indices = [tri.vertices for tri in mesh.loop_triangles]
-                
-                # To draw with normals, we need to pass them.
-                # 'TRIS' expects specific format depending on shader.
-                # For `3D_UNIFORM_COLOR` (flat), we only need pos.
-                # For a Lit look, we might need a custom shader or `3D_SMOOTH_COLOR` with fake light color?
-                # Actually, `3D_SMOOTH_COLOR` requires specific vertex colors.
-                # Simplest "Lit" look in GPU module without custom shader complexity:
-                # Use a custom shader that takes Normal and LightDir.
-                
-                # Let's bake Normals anyway.
-                # Note: mesh.vertices[i].normal is the vertex normal.
-                normals = [v.normal for v in mesh.vertices]
-                
-                # We create Two Batches? Or one batch with all info?
-                # UNIFORM_COLOR only uses 'pos'.
-                # A custom shader will use 'pos' and 'normal'.
-                
-                # Let's create a batch with both.
-                # batch_for_shader can take extra args but builtins might ignore them.
-                
-                batch_data = {"pos": vertices, "normal": normals}
-                
-                # We need a shader that uses normals.
-                # If we use built-in, we are limited.
-                # Let's stick to flat UNIFORM_COLOR for Silhouette/Wireframe.
-                # For Solid, we can try to use a simple custom shader.
-                
-                # We need a shader that uses normals.
-                # Use the Lit shader to define the batch layout so it accepts normals.
+            with profiling.measure("bake.to_mesh"):
+                mesh = eval_obj.to_mesh()
+            
+            if mesh:
+                with profiling.measure("bake.extraction"):
+                    arrays = extract_mesh_arrays(mesh)
+                if self.lod is not None and len(arrays[0]) == len(self.lod['clusters']):
+                    arrays = apply_lod(self.lod, arrays[0], arrays[1])
                 
-                batch = batch_for_shader(get_lit_shader(), 'TRIS', batch_data, indices=indices)
+                # Store
+                geometry_key = add_baked_frame(owner, f, matrix, *arrays, self.compact, lazy=self.instanced)
+                enforce_memory_budget(settings, self.pinned)
                 
-                # Wireframe needs edges ideally.
-                # calc_loop_triangles doesn't give edges directly in a way beneficial for wireframe overlay on tris?
-                # Actually `mesh.edges` exists.
-                edge_indices = [e.vertices for e in mesh.edges]
-                batch_wire = batch_for_shader(gpu.shader.from_builtin('UNIFORM_COLOR'), 'LINES', {"pos": vertices}, indices=edge_indices)
+                if store is not None:
+                    if geometry_key not in self.stored_geometry:
+                        self.stored_geometry[geometry_key] = store.add_geometry(*arrays)
+                    store.add_frame(f, matrix, self.stored_geometry[geometry_key], self.hashes[f])
                 
-                # Store
-                GHOST_CACHE[f] = {
-                    'batch': batch,
-                    'batch_wire': batch_wire,
-                    'matrix': eval_obj.matrix_world.copy()
-                }
+                if self.rigid:
+                    self.rigid_geometry = geometry_key
                 
+            eval_obj.to_mesh_clear()
+            GHOST_DIRTY.discard((owner, f))
+            
+    def close(self):
+        """Save the disk store"""
+        if self.store is not None:
+            store, self.store = self.store, None
+            store.save()
+        tag_view3d_redraw()
+
+@profiling.timed("bake.total")
+def bake_frames(context, obj, frames):
+    """Evaluate `obj` on each of `frames` and (re)place the results in GHOST_CACHE"""
+    bake_chunk(context, obj, 'MESH', frames)
+
+def bake_detail_frames(context, obj, frames):
+    """Bake full-detail shapes for cached reduced frames of `obj` (see wants_detail)"""
+    global _is_baking
+    settings = context.scene.animah_settings
+    frames = [f for f in frames if (obj.name, f) in GHOST_CACHE]
+    if not frames:
+        return
+    _is_baking = True
+    try:
+        with frame_evaluator(context.scene, context.view_layer, obj, settings.ghost_bake_scope) as evaluate:
+            for f in frames:
+                eval_obj = evaluate(f)
+                mesh = eval_obj.to_mesh()
+                if mesh:
+                    geometry_key = get_geometry(*extract_mesh_arrays(mesh), settings.ghost_compact,
+                                                lazy=settings.ghost_instanced)
+                    attach_detail(obj.name, f, geometry_key)
                 eval_obj.to_mesh_clear()
-                
     finally:
-        scene.frame_set(original_frame)
-        context.area.tag_redraw()
-        print("GPU Bake Complete.")
+        _is_baking = False
+        tag_view3d_redraw()
 
+# Points a trail follows, and up to how many indices they are read one by one instead of foreach_get
+TRAIL_MAX_POINTS = 64
+TRAIL_DIRECT_READ = 256
 
+def tracked_points(obj, settings):
+    """[(vertex indices, normalized weights)] of the points a motion trail follows:
+    each selected vertex, or the weighted centroid of the trail vertex group"""
+    mesh = obj.data
+    if settings.trail_source == 'GROUP':
+        group = obj.vertex_groups.get(settings.trail_vertex_group)
+        if group is None:
+            return []
+        members = [(v.index, g.weight) for v in mesh.vertices for g in v.groups
+                   if g.group == group.index and g.weight > 0.0]
+        if not members:
+            return []
+        indices, weights = zip(*members)
+        weights = np.array(weights, dtype=np.float32)
+        return [(np.array(indices, dtype=np.int32), weights / weights.sum())]
+        
+    # Selection as of the last Edit Mode exit
+    selected = np.zeros(len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get("select", selected)
+    indices = np.flatnonzero(selected)[:TRAIL_MAX_POINTS]
+    return [(np.array([i], dtype=np.int32), np.ones(1, dtype=np.float32)) for i in indices]
 
-def draw_ghosts():
-    context = bpy.context
-    if not context.scene.animah_settings.show_ghosts:
-        return
+def bake_trail(obj, points, vert_count, evaluate, frames):
+    """Evaluate `obj` on each of `frames` (with a frame_evaluator's `evaluate`),
+    keeping only the world positions of its tracked `points` (see tracked_points),
+    picked on a base mesh of `vert_count` vertices"""
+    indices = np.concatenate([p[0] for p in points])
+    trail = GHOST_TRAILS.setdefault(obj.name, {})
     
-    obj = context.active_object
-    if not obj or obj.type != 'MESH':
-        return
-        
+    for f in frames:
+        eval_obj = evaluate(f)
+        # The evaluated mesh is read in place, no to_mesh() copy
+        vertices = eval_obj.data.vertices
+        GHOST_TRAIL_DIRTY.discard((obj.name, f))
+        if len(vertices) != vert_count:
+            # Topology changing modifiers: indices no longer match the base mesh
+            continue
+        if len(indices) <= TRAIL_DIRECT_READ:
+            co = np.array([vertices[i].co for i in indices], dtype=np.float32)
+        else:
+            co = np.empty(vert_count * 3, dtype=np.float32)
+            vertices.foreach_get("co", co)
+            co = co.reshape(-1, 3)[indices]
+            
+        local = []
+        start = 0
+        for point_indices, weights in points:
+            local.append(weights @ co[start:start + len(point_indices)])
+            start += len(point_indices)
+        matrix = np.array(eval_obj.matrix_world, dtype=np.float32)
+        trail[f] = np.array(local) @ matrix[:3, :3].T + matrix[:3, 3]
+
+def build_trail_batches(trail, current_frame, settings):
+    """Polyline through every baked frame of each tracked point plus a tick per frame.
+    Past frames use the previous ghost color, future ones the next ghost color"""
+    frames = sorted(trail)
+    if len(frames) < 2:
+        return None
+    positions = np.stack([trail[f] for f in frames], axis=1)  # (points, frames, 3)
+    point_count, frame_count = positions.shape[:2]
+    
+    frame_colors = np.empty((frame_count, 4), dtype=np.float32)
+    for i, f in enumerate(frames):
+        if f < current_frame:
+            frame_colors[i] = settings.ghost_prev_color
+        elif f > current_frame:
+            frame_colors[i] = settings.ghost_next_color
+        else:
+            frame_colors[i] = (1.0, 1.0, 1.0, 1.0)
+    frame_colors[:, 3] = 1.0
+    
+    # One LINES batch for all points: segments between consecutive frames of each point
+    first = (np.arange(point_count)[:, None] * frame_count + np.arange(frame_count - 1)).ravel()
+    segments = np.stack([first, first + 1], axis=1).astype(np.int32)
+    coords = positions.reshape(-1, 3)
+    colors = np.tile(frame_colors, (point_count, 1))
+    shader = gpu.shader.from_builtin('SMOOTH_COLOR')
+    lines = batch_for_shader(shader, 'LINES', {"pos": coords, "color": colors}, indices=segments)
+    ticks = batch_for_shader(shader, 'POINTS', {"pos": coords, "color": colors})
+    return lines, ticks
+
+def restore_from_disk(context, obj, frames=None, include_stale=False):
+    """Fill GHOST_CACHE from the persistent cache of `obj`, memory mapped and uploaded on first draw.
+    
+    Frames whose content hash still matches are restored. With `include_stale` the
+    mismatched ones are restored too but marked stale, so only they get re-baked.
+    Returns the set of up-to-date frames restored.
+    """
     settings = context.scene.animah_settings
-    current_frame = context.scene.frame_current
+    store = disk_cache.open_object_store(obj)
+    if store is None or not store.frames():
+        return set()
+        
+    base_hash = disk_cache.mesh_hash(obj, settings.ghost_lod_ratio)
+    if store.mesh_hash != base_hash:
+        # Base mesh/topology/modifiers changed: nothing on disk can be trusted
+        return set()
+        
+    if frames is None:
+        frames = store.frames()
+    frames = [f for f in frames if store.frame_hash(f) is not None]
+    hashes = disk_cache.frame_hashes(obj, frames, base_hash)
     
-    display_type = settings.ghost_display_type
+    restored = set()
+    stale = []
+    for f in frames:
+        fresh = store.frame_hash(f) == hashes[f]
+        if not fresh and not include_stale:
+            continue
+        geo_id = store.frame_geometry(f)
+        positions, normals, tri_indices, edge_indices = store.load_geometry(geo_id)
+        key = ('disk', store.folder, geo_id, settings.ghost_compact)
+        geometry_key = get_geometry(positions, normals, tri_indices, edge_indices,
+                                    settings.ghost_compact, key=key, lazy=True)
+        store_entry(obj.name, f, store.frame_matrix(f), geometry_key)
+        if fresh:
+            restored.add(f)
+        else:
+            stale.append((obj.name, f))
+            
+    if stale:
+        GHOST_DIRTY.update(stale)
+        schedule_dirty_rebake()
+    enforce_memory_budget(settings, pinned_entries(context))
+    tag_view3d_redraw()
+    return restored
+
+def _restore_on_load_timer():
+    context = bpy.context
+    if not context.scene.animah_settings.ghost_disk_cache:
+        return None
+    for obj in ghost_objects(context):
+        restored = restore_from_disk(context, obj, include_stale=True)
+        if restored:
+            print(f"Animah: restored {len(restored)} ghost frames of '{obj.name}' from disk")
+    return None
+
+@bpy.app.handlers.persistent
+def restore_ghosts_on_load(dummy=None):
+    """Reopen the on-disk ghost cache of the newly loaded file"""
+    stop_dirty_rebake()
+    clear_cache()
+    # GPU work and context access are safer once the file is fully loaded
+    if not bpy.app.background and not bpy.app.timers.is_registered(_restore_on_load_timer):
+        bpy.app.timers.register(_restore_on_load_timer, first_interval=0.1)
+
+def bake_ghosts_to_memory(context, only_dirty=False):
+    """Bake evaluated meshes to GPU batches for the entire range, for every ghosted object.
     
-    # Select Shader
-    shader = None
-    if display_type == 'SOLID':
-        shader = get_lit_shader()
+    With `only_dirty` the cache is kept and just the frames invalidated by edits are re-baked.
+    Blocks until done, ANIMAH_OT_bake_ghosts runs the same jobs time-sliced instead.
+    """
+    for name, kind, frames in bake_jobs(context, only_dirty):
+        bake_chunk(context, bpy.data.objects[name], kind, frames)
+    print("GPU Bake Complete.")
+
+def bake_jobs(context, only_dirty=False):
+    """Work list of a bake: [(object name, kind, frames)] with frames nearest the playhead first.
+    
+    Clearing, disk restores and background workers happen here, the frames left
+    are baked by a BakeSession (all at once with bake_chunk, or a slice at a time).
+    """
+    if only_dirty:
+        # Stale frames are re-baked even for an object that is no longer pinned
+        owners = {name for name, _ in GHOST_DIRTY} | {name for name, _ in GHOST_TRAIL_DIRTY}
+        objects = [bpy.data.objects[name] for name in sorted(owners) if name in bpy.data.objects]
+        for dirty in (GHOST_DIRTY, GHOST_TRAIL_DIRTY):
+            dirty.difference_update([k for k in dirty if k[0] not in bpy.data.objects])
     else:
-        shader = get_shader() # UNIFORM_COLOR
+        objects = ghost_objects(context)
         
-    shader.bind()
+    jobs = []
+    for obj in objects:
+        kind, frames = prepare_object_bake(context, obj, only_dirty)
+        if frames:
+            current = context.scene.frame_current
+            frames.sort(key=lambda f: (abs(f - current), f))
+            jobs.append((obj.name, kind, frames))
+    return jobs
+
+def prepare_object_bake(context, obj, only_dirty=False):
+    """Get one object ready for baking, leaving the other objects' caches untouched.
     
-    # Setup Blending
-    gpu.state.blend_set('ALPHA')
+    Returns (kind, frames): 'TRAIL' or 'MESH' and the frames still to be evaluated.
+    """
+    owner = obj.name
+    if context.scene.animah_settings.ghost_display_type == 'TRAIL':
+        # Trails are cheap enough to always cover the whole range
+        if only_dirty:
+            frames = sorted(f for name, f in GHOST_TRAIL_DIRTY if name == owner)
+        else:
+            GHOST_TRAILS.pop(owner, None)
+            GHOST_TRAIL_POINTS.pop(owner, None)
+            GHOST_TRAIL_DIRTY.difference_update([k for k in GHOST_TRAIL_DIRTY if k[0] == owner])
+            frames = list(range(context.scene.frame_start, context.scene.frame_end + 1))
+        print(f"Baking the motion trail of '{owner}' on {len(frames)} frames...")
+        return 'TRAIL', frames
+        
+    if only_dirty:
+        frames = sorted(f for name, f in GHOST_DIRTY if name == owner)
+        print(f"Re-baking {len(frames)} stale ghost frames of '{owner}'...")
+    elif context.scene.animah_settings.ghost_bake_mode == 'WINDOW':
+        # On demand: start over with only the frames the ghosts show right now
+        clear_cache(owner)
+        frames = missing_window_frames(context.scene, obj)
+        print(f"Baking {len(frames)} ghost frames of '{owner}' around the playhead...")
+    else:
+        clear_cache(owner)
+        start = context.scene.frame_start
+        end = context.scene.frame_end
+        frames = list(range(start, end + 1))
+        print(f"Baking Ghosts of '{owner}' to GPU Memory from {start} to {end}...")
+        
+        # Frames whose content is unchanged come straight back from the on-disk cache
+        if context.scene.animah_settings.ghost_disk_cache:
+            restored = restore_from_disk(context, obj, frames)
+            if restored:
+                print(f"{len(restored)} frames restored from the disk cache")
+                frames = [f for f in frames if f not in restored]
+        
+        # Long ranges are split across background Blender processes
+        workers = context.scene.animah_settings.ghost_bake_workers
+        if workers > 1 and len(frames) >= workers * bake_worker.MIN_FRAMES_PER_WORKER:
+            delivered = bake_worker.bake_in_workers(context, obj, frames, workers)
+            frames = [f for f in frames if f not in delivered]
+            if frames:
+                print(f"{len(frames)} frames not delivered by workers, baking them in-process...")
     
-    # Calculate frames...
-    # (Reuse same logic for finding frames)
-    frames_to_draw = []
+    return 'MESH', frames
+
+def bake_chunk(context, obj, kind, frames):
+    """Evaluate and store all `frames` of one bake job (see bake_jobs) in one go"""
+    session = BakeSession(context, obj, kind, frames)
+    try:
+        session.bake(context, frames)
+    finally:
+        session.close()
+
+def shape_key_frame_range(obj, shape_key_name):
+    """Frames a shape key can influence, worked out from its F-Curve's keyframe extents.
     
+    Returns (first, last). Sides that can influence frames beyond the keys
+    (non-zero constant extrapolation, linear extrapolation, cycles) are open (+/-inf).
+    """
+    unbounded = (float('-inf'), float('inf'))
+    key = obj.data.shape_keys if obj.data else None
+    if not key or not key.animation_data or not key.animation_data.action:
+        return unbounded
+        
+    fcurve = key.animation_data.action.fcurves.find(f'key_blocks["{shape_key_name}"].value')
+    if not fcurve or not fcurve.keyframe_points:
+        # Static shape key: affects every frame
+        return unbounded
+    if fcurve.modifiers or fcurve.extrapolation != 'CONSTANT':
+        return unbounded
+        
+    points = fcurve.keyframe_points
+    first, last = points[0].co, points[-1].co
+    start = first[0] if abs(first[1]) < 1e-6 else float('-inf')
+    end = last[0] if abs(last[1]) < 1e-6 else float('inf')
+    return (start, end)
+
+def invalidate_frames(owner, start, end):
+    """Mark the cached frames of object `owner` in [start, end] as stale"""
+    stale = [(name, f) for name, f in GHOST_CACHE if name == owner and start <= f <= end]
+    stale_trail = [(owner, f) for f in GHOST_TRAILS.get(owner, ()) if start <= f <= end]
+    GHOST_DIRTY.update(stale)
+    GHOST_TRAIL_DIRTY.update(stale_trail)
+    if stale or stale_trail:
+        schedule_dirty_rebake()
+    return len(stale) + len(stale_trail)
+
+def invalidate_shape_key(obj, shape_key_name):
+    """Mark every cached frame that the given polish shape key influences as stale"""
+    start, end = shape_key_frame_range(obj, shape_key_name)
+    return invalidate_frames(obj.name, start, end)
+
+def find_polish_item(obj, shape_key_name):
+    for track in obj.animah_tracks:
+        for item in track.items:
+            if item.shape_key_name == shape_key_name:
+                return item
+    return None
+
+_last_edit_time = 0.0
+REBAKE_DELAY = 0.5
+# Seconds of re-baking per timer tick, the UI stays responsive in between
+REBAKE_BUDGET = 0.05
+REBAKE_TICK = 0.01
+# Running automatic re-bake: {'jobs': bake_jobs(only_dirty=True), 'session': BakeSession or None,
+#   'frame_time': seconds per frame, 'started': monotonic time}. None when idle
+_dirty_rebake = None
+
+def schedule_dirty_rebake():
+    """Re-bake stale frames shortly after the last edit (debounced)"""
+    global _last_edit_time
+    _last_edit_time = time.monotonic()
+    if not bpy.app.timers.is_registered(_rebake_dirty_timer):
+        bpy.app.timers.register(_rebake_dirty_timer, first_interval=REBAKE_DELAY)
+
+def stop_dirty_rebake():
+    """End the automatic re-bake, keeping what it baked (the rest stays stale)"""
+    global _dirty_rebake
+    rebake, _dirty_rebake = _dirty_rebake, None
+    if rebake is not None and rebake['session'] is not None:
+        rebake['session'].close()
+
+def _rebake_dirty_timer():
+    """Re-bake the stale frames a slice per tick, like ANIMAH_OT_bake_ghosts.
+    Edits (a new sculpt stroke) and playback pause it."""
+    global _dirty_rebake
+    context = bpy.context
+    settings = context.scene.animah_settings
+    # A running bake operator re-bakes (or clears) these frames itself
+    if not settings.show_ghosts or not settings.auto_update_ghosts or _bake_progress is not None:
+        stop_dirty_rebake()
+        return None
+    if _dirty_rebake is None and not (GHOST_DIRTY or GHOST_TRAIL_DIRTY):
+        return None
+        
+    # Wait for the edit burst (e.g. a sculpt stroke) to finish
+    remaining = REBAKE_DELAY - (time.monotonic() - _last_edit_time)
+    if remaining > 0:
+        return remaining
+        
+    screen = context.screen
+    if screen and screen.is_animation_playing:
+        return REBAKE_DELAY
+        
+    if _dirty_rebake is None:
+        _dirty_rebake = {'jobs': bake_jobs(context, only_dirty=True), 'session': None,
+                         'frame_time': REBAKE_BUDGET, 'started': time.monotonic()}
+    rebake = _dirty_rebake
+    jobs = rebake['jobs']
+    tick_start = time.monotonic()
+    while jobs and time.monotonic() - tick_start < REBAKE_BUDGET:
+        name, kind, frames = jobs[0]
+        obj = bpy.data.objects.get(name)
+        if obj is not None and rebake['session'] is None:
+            rebake['session'] = BakeSession(context, obj, kind, frames)
+        if obj is not None:
+            count = max(1, int(REBAKE_BUDGET / rebake['frame_time']))
+            chunk = frames[:count]
+            del frames[:count]
+            chunk_start = time.monotonic()
+            try:
+                rebake['session'].bake(context, chunk)
+            except Exception:
+                stop_dirty_rebake()
+                raise
+            rebake['frame_time'] = max((time.monotonic() - chunk_start) / len(chunk), 1e-4)
+        if obj is None or not frames:
+            jobs.pop(0)
+            if rebake['session'] is not None:
+                rebake['session'].close()
+                rebake['session'] = None
+    if jobs:
+        return REBAKE_TICK
+        
+    _dirty_rebake = None
+    # Frames made stale by edits during the re-bake were not in its jobs
+    if _last_edit_time > rebake['started']:
+        return REBAKE_DELAY
+    return None
+
+@bpy.app.handlers.persistent
+def track_polish_edits(scene, depsgraph):
+    """Invalidate the frames of a polish shape key when its geometry is edited (e.g. sculpting)"""
+    if _is_baking or not (GHOST_CACHE or GHOST_TRAILS):
+        return
+        
+    obj = bpy.context.active_object
+    if not obj or obj.type != 'MESH' or not obj.active_shape_key:
+        return
+        
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and update.id.original == obj:
+            if find_polish_item(obj, obj.active_shape_key.name):
+                invalidate_shape_key(obj, obj.active_shape_key.name)
+            return
+
+# Sorted keyed frames: { tuple of action pointers: (their action revisions, [frame, ...]) }
+_keyed_frames = {}
+
+def keyed_frames(obj):
+    """Sorted frames keyed in the object, shape-key or rig actions of `obj`.
+    
+    Built once with foreach_get and reused until one of the actions is edited.
+    """
+    actions = disk_cache.animation_actions(obj) if obj.data else []
+    index_key = tuple(action.as_pointer() for action in actions)
+    revisions = tuple(animation_edits.action_revision(action) for action in actions)
+    cached = _keyed_frames.get(index_key)
+    if cached is None or cached[0] != revisions:
+        chunks = [animation_edits.keyframe_co(fc)[:, 0] for action in actions for fc in action.fcurves]
+        frames = np.unique(np.concatenate(chunks).astype(np.int64)).tolist() if chunks else []
+        cached = _keyed_frames[index_key] = (revisions, frames)
+    return cached[1]
+
+def find_nearest_keyframes(obj, current_frame, count, direction='PREV'):
+    """Find the nearest 'count' keyframes in the given direction from current_frame, closest first"""
+    frames = keyed_frames(obj)
+    if direction == 'PREV':
+        end = bisect.bisect_left(frames, current_frame)
+        return frames[max(end - count, 0):end][::-1]
+    # NEXT
+    start = bisect.bisect_right(frames, current_frame)
+    return frames[start:start + count]
+
+def get_ghost_frames(obj, current_frame, settings):
+    """Frames the current ghost settings show around current_frame.
+    
+    Returns (prev_frames, next_frames), each ordered nearest first.
+    """
     length = settings.ghost_length
+    if settings.ghost_type == 'KEYFRAME':
+        return (
+            find_nearest_keyframes(obj, current_frame, length, 'PREV'),
+            find_nearest_keyframes(obj, current_frame, length, 'NEXT'),
+        )
+        
     step = settings.ghost_step
+    prev_frames = [current_frame - (i * step) for i in range(1, length + 1)]
+    next_frames = [current_frame + (i * step) for i in range(1, length + 1)]
+    return prev_frames, next_frames
+
+def missing_window_frames(scene, obj, evicted_only=False):
+    """Frames inside the scene range that draw_ghosts would show now but are not baked yet.
+    
+    With `evicted_only`, just the ones that were baked before and dropped by the memory budget.
+    """
+    prev_frames, next_frames = get_ghost_frames(obj, scene.frame_current, scene.animah_settings)
+    return sorted(
+        f for f in prev_frames + next_frames
+        if scene.frame_start <= f <= scene.frame_end and (obj.name, f) not in GHOST_CACHE
+        and (not evicted_only or (obj.name, f) in GHOST_EVICTED)
+    )
+
+WINDOW_RETRY = 0.25
+
+def schedule_window_bake():
+    """Bake the frames around the playhead on the next timer tick (frame_set is not allowed in handlers)"""
+    if not bpy.app.timers.is_registered(_bake_window_timer):
+        bpy.app.timers.register(_bake_window_timer, first_interval=0.0)
+
+def _bake_window_timer():
+    context = bpy.context
+    scene = context.scene
+    settings = scene.animah_settings
+    on_demand = settings.ghost_bake_mode == 'WINDOW'
+    detail = wants_detail(settings)
+    if not settings.show_ghosts or not (on_demand or GHOST_EVICTED or detail):
+        return None
+    if settings.ghost_display_type == 'TRAIL':
+        return None
+        
+    # Changing frames mid-playback would stutter, extend the window once it stops
+    screen = context.screen
+    if screen and screen.is_animation_playing:
+        return WINDOW_RETRY
+        
+    for obj in ghost_objects(context):
+        # A full-range bake only brings back frames the memory budget evicted
+        frames = missing_window_frames(scene, obj, evicted_only=not on_demand)
+        if frames:
+            bake_frames(context, obj, frames)
+            
+    # Full detail follows the playhead: only the nearest ghosts keep it
+    near = detail_entries(context) if detail else set()
+    release_details(near)
+    for obj in ghost_objects(context):
+        frames = [f for name, f in near if name == obj.name
+                  and (name, f) in GHOST_CACHE and 'detail' not in GHOST_CACHE[(name, f)]]
+        if frames:
+            bake_detail_frames(context, obj, frames)
+    return None
+
+@bpy.app.handlers.persistent
+def extend_ghost_window(scene, depsgraph=None):
+    """Slide the on-demand bake window along with the playhead (and restore evicted frames)"""
+    # Frame changes of a bake (or of its temporary scene) are not playhead moves
+    if _is_baking or scene != bpy.context.scene:
+        return
+    settings = getattr(scene, "animah_settings", None)
+    if settings and settings.show_ghosts and (settings.ghost_bake_mode == 'WINDOW' or GHOST_EVICTED
+                                              or wants_detail(settings)):
+        schedule_window_bake()
+
+def get_draw_plan(context):
+    """What draw_ghosts draws: the visible cached frames with their fade colors, split into
+    instanced groups { topology: {'items', 'atlas', 'atlas_version', 'blocks'} } and per-frame [(entry, color)].
+    
+    Built once per (current frame, active object, settings, cache and animation edit
+    revisions) and shared by every viewport and redraw until one of them changes.
+    """
+    global _draw_plan
+    scene = context.scene
+    active = context.active_object
+    key = (scene.as_pointer(), scene.frame_current, active.name if active else None,
+           _settings_revision, _cache_revision, animation_edits.revision())
+    if _draw_plan is not None and _draw_plan['key'] == key:
+        return _draw_plan
+        
+    settings = scene.animah_settings
+    current_frame = scene.frame_current
+    
+    if settings.ghost_display_type == 'TRAIL':
+        trails = []
+        for obj in ghost_objects(context):
+            batches = build_trail_batches(GHOST_TRAILS.get(obj.name, {}), current_frame, settings)
+            if batches:
+                trails.append(batches)
+        _draw_plan = {'key': key, 'display_type': 'TRAIL', 'instanced': {}, 'per_frame': [], 'trails': trails}
+        return _draw_plan
+    
+    # Calculate frames...
+    entries_to_draw = []
+    length = settings.ghost_length
     
     # Helper to clean logic
     def get_fade_col(base_col, i, length):
@@ -187,118 +1613,170 @@ def draw_ghosts():
         c[3] *= fade
         return c
 
-    def find_nearest_keyframes(obj, current_frame, count, direction='PREV'):
-        """Find the nearest 'count' keyframes in the given direction from current_frame"""
-        found_frames = []
-        
-        # We look at the Action of the active object or its shape keys
-        # Primarily finding keyframes on the "Polisher" properties or Shape Keys could be complex.
-        # Let's assume we want to ghost strictly on frames where the OBJECT or SHAPE KEYS have keys.
-        # For this addon, we care about the Shape Key Action.
-        
-        action = None
-        if obj.data and obj.data.shape_keys and obj.data.shape_keys.animation_data:
-            action = obj.data.shape_keys.animation_data.action
-            
-        if not action:
-            return []
-            
-        # Collect all unique frame numbers from the action
-        all_keys = set()
-        for fc in action.fcurves:
-            for kp in fc.keyframe_points:
-                all_keys.add(int(kp.co[0]))
+    for obj in ghost_objects(context):
+        prev_frames, next_frames = get_ghost_frames(obj, current_frame, settings)
+                
+        for i, f in enumerate(prev_frames):
+            if (obj.name, f) in GHOST_CACHE:
+                entries_to_draw.append(((obj.name, f), get_fade_col(settings.ghost_prev_color, i, length)))
                 
-        sorted_keys = sorted(list(all_keys))
-        
-        if direction == 'PREV':
-            # Filter for frames < current_frame, reverse sort to get closest first
-            candidates = [f for f in sorted_keys if f < current_frame]
-            candidates.sort(reverse=True)
-        else: # NEXT
-            # Filter for frames > current_frame, sort to get closest first
-            candidates = [f for f in sorted_keys if f > current_frame]
-            candidates.sort()
+        for i, f in enumerate(next_frames):
+            if (obj.name, f) in GHOST_CACHE:
+                 entries_to_draw.append(((obj.name, f), get_fade_col(settings.ghost_next_color, i, length)))
+    
+    # Keep the LRU order: drawn frames are the most recently used
+    for entry_key, _ in entries_to_draw:
+        GHOST_CACHE.move_to_end(entry_key)
             
-        return candidates[:count]
-
-    # PREV
-    frames = []
-    if settings.ghost_type == 'KEYFRAME':
-        frames = find_nearest_keyframes(obj, current_frame, length, 'PREV')
-    else:
-        for i in range(1, length + 1):
-            frames.append(current_frame - (i * step))
+    # Instanced: shapes kept as arrays are drawn together, one call per topology
+    per_frame = []
+    instanced = {}
+    for entry_key, color in entries_to_draw:
+        data = GHOST_CACHE[entry_key]
+        if 'detail' in data:
+            data = {'matrix': data['matrix'], 'geometry': data['detail']}
+        geometry = GHOST_GEOMETRY[data['geometry']]
+        if settings.ghost_instanced and not geometry['compact'] and 'arrays' in geometry:
+            group = instanced.setdefault(geometry['topology'],
+                                         {'items': [], 'atlas': None, 'atlas_version': None, 'blocks': None})
+            group['items'].append((data, color))
+        else:
+            per_frame.append((data, color))
             
-    for i, f in enumerate(frames):
-        if f in GHOST_CACHE:
-            frames_to_draw.append((f, get_fade_col(settings.ghost_prev_color, i, length)))
+    _draw_plan = {
+        'key': key,
+        'display_type': settings.ghost_display_type,
+        'instanced': instanced,
+        'per_frame': per_frame,
+        'trails': [],
+    }
+    return _draw_plan
 
-    # NEXT
-    frames = []
-    if settings.ghost_type == 'KEYFRAME':
-        frames = find_nearest_keyframes(obj, current_frame, length, 'NEXT')
+def draw_trails(trails):
+    shader = gpu.shader.from_builtin('SMOOTH_COLOR')
+    gpu.state.blend_set('ALPHA')
+    gpu.state.line_width_set(2.0)
+    gpu.state.point_size_set(5.0)
+    for lines, ticks in trails:
+        lines.draw(shader)
+        ticks.draw(shader)
+    gpu.state.point_size_set(1.0)
+    gpu.state.line_width_set(1.0)
+    gpu.state.blend_set('NONE')
+
+@profiling.timed("draw_ghosts")
+def draw_ghosts():
+    context = bpy.context
+    if not context.scene.animah_settings.show_ghosts:
+        return
+    
+    plan = get_draw_plan(context)
+    if plan['trails']:
+        draw_trails(plan['trails'])
+        return
+    if not plan['instanced'] and not plan['per_frame']:
+        return
+        
+    display_type = plan['display_type']
+    
+    # Select Shader
+    shader = None
+    if display_type == 'SOLID':
+        shader = get_lit_shader()
     else:
-        for i in range(1, length + 1):
-            frames.append(current_frame + (i * step))
-            
-    for i, f in enumerate(frames):
-        if f in GHOST_CACHE:
-             frames_to_draw.append((f, get_fade_col(settings.ghost_next_color, i, length)))
+        shader = get_shader() # UNIFORM_COLOR
+    # Packed frames need their own decoding shader
+    compact_shader = None
+    
+    # Setup Blending
+    gpu.state.blend_set('ALPHA')
+    
+    per_frame = plan['per_frame']
+    for topology_key in list(plan['instanced']):
+        if not draw_instanced(topology_key, plan['instanced'][topology_key], display_type):
+            # Could not be packed: drawn one by one from now on
+            per_frame += plan['instanced'].pop(topology_key)['items']
             
     # DRAW
-    for frame_idx, color in frames_to_draw:
-        data = GHOST_CACHE.get(frame_idx)
-        if not data:
-            continue
-            
+    for data, color in per_frame:
         matrix = data['matrix']
+        geometry = GHOST_GEOMETRY[data['geometry']]
+        if geometry['batch'] is None:
+            upload_geometry(geometry)
         
         gpu.matrix.push()
         gpu.matrix.multiply_matrix(matrix)
         
-        shader.uniform_float("color", color)
-        
-        if display_type == 'SOLID':
-            # Needs viewProjectionMatrix?
-            # Custom shaders usually need explicit update of builtin uniforms
-            # Or uses `gpu.matrix.get_model_view_matrix()` etc?
-            # Actually gpu.types.GPUShader creates a shader that might NOT automatically bind the builtins the way `from_builtin` does.
-            # However, recent Blender wrapper handles `viewProjectionMatrix` if named correctly.
-            # We need `modelMatrix` too.
-            # In new GPU API, we often pass `gpu.matrix.get_model_view_matrix()` to uniform.
-            # But let's check standard practice.
-            # Simpler: use built-in for simplicity if possible. 
-            pass # Shader will use uniforms
-            
+        if geometry['compact']:
+            if compact_shader is None:
+                compact_shader = get_lit_shader(compact=True)
+            frame_shader = compact_shader
+            frame_shader.bind()
+            frame_shader.uniform_float("bboxMin", geometry['bbox_min'])
+            frame_shader.uniform_float("bboxSize", geometry['bbox_size'])
+            frame_shader.uniform_float("lighting", 1.0 if display_type == 'SOLID' else 0.0)
+        else:
+            frame_shader = shader
+            frame_shader.bind()
+        
+        frame_shader.uniform_float("color", color)
+        
         if display_type == 'WIRE':
             # Use Wire Batch
-            if 'batch_wire' in data:
-                data['batch_wire'].draw(shader)
+            geometry['batch_wire'].draw(frame_shader)
         else:
              # SOLID or SILHOUETTE
              # Both use 'batch' (TRIS)
              # SOLID uses custom shader which reads pos/normal. 'batch' has them.
              # SILHOUETTE uses UNIFORM_COLOR which reads pos. 'batch' has them.
-             data['batch'].draw(shader)
+             geometry['batch'].draw(frame_shader)
              
         gpu.matrix.pop()
         
     gpu.state.blend_set('NONE')
 
+def update_memory_budget(self, context):
+    """Apply a lowered budget right away instead of at the next bake"""
+    enforce_memory_budget(self, pinned_entries(context))
+    update_ghosts(self, context)
+
 def update_ghosts(self, context):
+    bump_settings_revision()
     # Just trigger redraw
     if context.area:
         context.area.tag_redraw()
+    # Length/step/type changes can widen the on-demand window
+    extend_ghost_window(context.scene)
 
 def register():
     global _handler
     if _handler is None:
         _handler = bpy.types.SpaceView3D.draw_handler_add(draw_ghosts, (), 'WINDOW', 'POST_VIEW')
+        
+    if track_polish_edits not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(track_polish_edits)
+    if extend_ghost_window not in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.append(extend_ghost_window)
+    if restore_ghosts_on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(restore_ghosts_on_load)
 
 def unregister():
     global _handler
     if _handler is not None:
         bpy.types.SpaceView3D.draw_handler_remove(_handler, 'WINDOW')
         _handler = None
+        
+    if track_polish_edits in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(track_polish_edits)
+    if extend_ghost_window in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.remove(extend_ghost_window)
+    if restore_ghosts_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(restore_ghosts_on_load)
+    if bpy.app.timers.is_registered(_restore_on_load_timer):
+        bpy.app.timers.unregister(_restore_on_load_timer)
+    if bpy.app.timers.is_registered(_bake_window_timer):
+        bpy.app.timers.unregister(_bake_window_timer)
+    if bpy.app.timers.is_registered(_rebake_dirty_timer):
+        bpy.app.timers.unregister(_rebake_dirty_timer)
+    stop_dirty_rebake()
     clear_cache()
@@ -1,4 +1,6 @@
 import bpy
+import time
+from bpy_extras.io_utils import ExportHelper
 from .properties import PolishItem
 
 class ANIMAH_OT_add_track(bpy.types.Operator):
@@ -42,12 +44,131 @@ class ANIMAH_OT_bake_ghosts(bpy.types.Operator):
     bl_idname = "animah.bake_ghosts"
     bl_label = "Bake Ghosts"
     
+    only_dirty: bpy.props.BoolProperty(
+        name="Only Stale Frames",
+        description="Keep the cache and re-bake only frames invalidated by polish edits",
+        default=False,
+        options={'SKIP_SAVE'}
+    )
+    
+    # Seconds of baking per timer tick, the UI stays responsive in between
+    TICK_BUDGET = 0.05
+    
     def execute(self, context):
         from . import ghosting
-        ghosting.bake_ghosts_to_memory(context)
+        ghosting.bake_ghosts_to_memory(context, only_dirty=self.only_dirty)
         # Enable display if not enabled
         context.scene.animah_settings.show_ghosts = True
         return {'FINISHED'}
+        
+    def invoke(self, context, event):
+        from . import ghosting
+        if ghosting.bake_progress() is not None:
+            self.report({'WARNING'}, "A ghost bake is already running")
+            return {'CANCELLED'}
+            
+        # Enable display so frames show up as soon as they are baked
+        context.scene.animah_settings.show_ghosts = True
+        self._jobs = ghosting.bake_jobs(context, only_dirty=self.only_dirty)
+        self._total = sum(len(frames) for _, _, frames in self._jobs)
+        self._done = 0
+        if not self._total:
+            return {'FINISHED'}
+            
+        # Unknown until the first frame is measured
+        self._frame_time = self.TICK_BUDGET
+        # Set up once per job (disk store, hashes, LOD map...), fed a slice per tick
+        self._session = None
+        self.open_session(context)
+        ghosting.set_bake_progress((0, self._total))
+        wm = context.window_manager
+        wm.progress_begin(0, self._total)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        self.update_status(context)
+        return {'RUNNING_MODAL'}
+        
+    def modal(self, context, event):
+        from . import ghosting
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.finish(context)
+            self.report({'INFO'}, f"Ghost bake cancelled, {self._done} of {self._total} frames baked")
+            return {'CANCELLED'}
+        if event.type != 'TIMER' or event.timer != self._timer:
+            return {'PASS_THROUGH'}
+            
+        tick_start = time.monotonic()
+        while self._jobs and time.monotonic() - tick_start < self.TICK_BUDGET:
+            session = self.open_session(context)
+            if session is None:
+                continue
+                
+            # Size the slice to fill the budget
+            frames = self._jobs[0][2]
+            count = max(1, int(self.TICK_BUDGET / self._frame_time))
+            chunk = frames[:count]
+            del frames[:count]
+            chunk_start = time.monotonic()
+            try:
+                session.bake(context, chunk)
+            except Exception:
+                self.finish(context)
+                raise
+            self._frame_time = max((time.monotonic() - chunk_start) / len(chunk), 1e-4)
+            self._done += len(chunk)
+            if not frames:
+                self.close_session()
+                self._jobs.pop(0)
+                
+        if not self._jobs:
+            self.finish(context)
+            print("GPU Bake Complete.")
+            return {'FINISHED'}
+        self.update_status(context)
+        return {'PASS_THROUGH'}
+        
+    def open_session(self, context):
+        """BakeSession of the current job, None (and the job dropped) if its object was deleted"""
+        from . import ghosting
+        name, kind, frames = self._jobs[0]
+        obj = bpy.data.objects.get(name)
+        if obj is None:
+            self.close_session()
+            self._total -= len(frames)
+            self._jobs.pop(0)
+            return None
+        if self._session is None:
+            self._session = ghosting.BakeSession(context, obj, kind, frames)
+        return self._session
+        
+    def close_session(self):
+        if self._session is not None:
+            session, self._session = self._session, None
+            session.close()
+            
+    def update_status(self, context):
+        from . import ghosting
+        ghosting.set_bake_progress((self._done, self._total))
+        context.window_manager.progress_update(self._done)
+        context.workspace.status_text_set(f"Baking ghosts: {self._done} / {self._total} frames (Esc to cancel)")
+        
+    def cancel(self, context):
+        # Window closed or another file loaded
+        self.finish(context)
+        
+    def finish(self, context):
+        from . import ghosting
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        try:
+            # Cancelled or failed mid-job: keep what was baked
+            self.close_session()
+        finally:
+            # Never leave the progress set, later bakes would be refused
+            ghosting.set_bake_progress(None)
+            wm.progress_end()
+            context.workspace.status_text_set(None)
+            ghosting.tag_view3d_redraw()
 
 class ANIMAH_OT_add_polish_frame(bpy.types.Operator):
     """Add a polish shape key for the current frame"""
@@ -112,6 +233,10 @@ class ANIMAH_OT_add_polish_frame(bpy.types.Operator):
                     kp.handle_right_type = 'AUTO_CLAMPED'
                 fc.update()
 
+        # Only the frames inside the new key's window changed
+        from . import ghosting
+        ghosting.invalidate_shape_key(obj, sk.name)
+
         # Add to track data
         item = track.items.add()
         item.name = shape_name
@@ -158,6 +283,10 @@ class ANIMAH_OT_remove_polish_item(bpy.types.Operator):
         
         # 1. Remove the shape key from the mesh
         if obj.data.shape_keys and shape_key_name in obj.data.shape_keys.key_blocks:
+            # Frames it influenced will look different once it is gone
+            from . import ghosting
+            ghosting.invalidate_shape_key(obj, shape_key_name)
+            
             sk = obj.data.shape_keys.key_blocks[shape_key_name]
             obj.shape_key_remove(sk)
             self.report({'INFO'}, f"Deleted Shape Key: {shape_key_name}")
@@ -212,9 +341,55 @@ class ANIMAH_OT_reset_polish_frame(bpy.types.Operator):
         # Update mesh
         obj.data.update()
         
+        from . import ghosting
+        ghosting.invalidate_shape_key(obj, active_sk.name)
+        
         self.report({'INFO'}, f"Reset Shape Key: {active_sk.name}")
         return {'FINISHED'}
 
+class ANIMAH_OT_toggle_profiling(bpy.types.Operator):
+    """Start or stop recording handler and bake timings"""
+    bl_idname = "animah.toggle_profiling"
+    bl_label = "Toggle Profiling"
+    
+    def execute(self, context):
+        from . import profiling
+        profiling.set_enabled(not profiling.is_enabled())
+        return {'FINISHED'}
+
+class ANIMAH_OT_reset_profiling(bpy.types.Operator):
+    """Forget every recorded timing"""
+    bl_idname = "animah.reset_profiling"
+    bl_label = "Reset Profiling"
+    
+    def execute(self, context):
+        from . import profiling
+        profiling.reset()
+        return {'FINISHED'}
+
+class ANIMAH_OT_export_profiling(bpy.types.Operator, ExportHelper):
+    """Export recorded timings (averages, p95 and raw samples) to JSON, or to CSV with a .csv name"""
+    bl_idname = "animah.export_profiling"
+    bl_label = "Export Profiling"
+    
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json;*.csv", options={'HIDDEN'})
+    
+    def check(self, context):
+        # Keep a .csv extension instead of forcing .json
+        if self.filepath.lower().endswith(".csv"):
+            return False
+        return super().check(context)
+    
+    def execute(self, context):
+        from . import profiling
+        if not profiling.SAMPLES:
+            self.report({'WARNING'}, "No timings recorded, enable profiling first")
+            return {'CANCELLED'}
+        profiling.export(self.filepath)
+        self.report({'INFO'}, f"Profiling exported to {self.filepath}")
+        return {'FINISHED'}
+
 classes = (
     ANIMAH_OT_add_track,
     ANIMAH_OT_remove_track,
@@ -222,6 +397,9 @@ classes = (
     ANIMAH_OT_remove_polish_item,
     ANIMAH_OT_reset_polish_frame,
     ANIMAH_OT_bake_ghosts,
+    ANIMAH_OT_toggle_profiling,
+    ANIMAH_OT_reset_profiling,
+    ANIMAH_OT_export_profiling,
 )
 
 def register():
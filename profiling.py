@@ -0,0 +1,95 @@
+"""Opt-in wall time instrumentation of the handlers and bake phases.
+
+Timings land in fixed-size ring buffers (one per name), so profiling can stay on
+for a whole session. Nothing is recorded while disabled, and the wrappers only cost
+a flag check.
+"""
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Samples kept per name, older ones are dropped
+RING_SIZE = 512
+
+SAMPLES = {}
+_enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = enabled
+
+def reset():
+    SAMPLES.clear()
+
+def record(name, seconds):
+    ring = SAMPLES.get(name)
+    if ring is None:
+        ring = SAMPLES[name] = deque(maxlen=RING_SIZE)
+    ring.append(seconds)
+
+@contextmanager
+def measure(name):
+    """Time the enclosed block under `name`"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def timed(name):
+    """Decorator timing every call of a function under `name`.
+
+    Put it below @bpy.app.handlers.persistent so the handler flag lands on the wrapper.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def stats():
+    """{ name: {'count', 'avg_ms', 'p95_ms', 'max_ms'} } over the samples in the ring buffers"""
+    result = {}
+    for name, ring in sorted(SAMPLES.items()):
+        if not ring:
+            continue
+        ordered = sorted(ring)
+        result[name] = {
+            'count': len(ordered),
+            'avg_ms': sum(ordered) / len(ordered) * 1000.0,
+            'p95_ms': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000.0,
+            'max_ms': ordered[-1] * 1000.0,
+        }
+    return result
+
+def export(filepath):
+    """Write the stats to `filepath`: CSV for a .csv path, JSON (stats + raw samples) otherwise"""
+    summary = stats()
+    if filepath.lower().endswith(".csv"):
+        with open(filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "count", "avg_ms", "p95_ms", "max_ms"])
+            for name, s in summary.items():
+                writer.writerow([name, s['count'], f"{s['avg_ms']:.4f}", f"{s['p95_ms']:.4f}", f"{s['max_ms']:.4f}"])
+    else:
+        for name, s in summary.items():
+            s['samples_ms'] = [v * 1000.0 for v in SAMPLES[name]]
+        with open(filepath, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -3,10 +3,10 @@ from bpy.props import StringProperty, IntProperty, FloatProperty, BoolProperty,
 from . import ghosting
 
 def update_item_color(self, context):
-    """Force dopesheet redraw when item color changes"""
+    """Force HUD redraw (Dope Sheet and Graph Editor) when item color changes"""
     for window in context.window_manager.windows:
         for area in window.screen.areas:
-            if area.type == 'DOPESHEET_EDITOR':
+            if area.type in {'DOPESHEET_EDITOR', 'GRAPH_EDITOR'}:
                 area.tag_redraw()
 
 class PolishItem(bpy.types.PropertyGroup):
@@ -56,10 +56,10 @@ class PolishTrack(bpy.types.PropertyGroup):
     )
     
 def update_hud(self, context):
-    """Force dopesheet redraw when HUD settings change"""
+    """Force HUD redraw (Dope Sheet and Graph Editor) when HUD settings change"""
     for window in context.window_manager.windows:
         for area in window.screen.areas:
-            if area.type == 'DOPESHEET_EDITOR':
+            if area.type in {'DOPESHEET_EDITOR', 'GRAPH_EDITOR'}:
                 area.tag_redraw()
 
 class PolisherSettings(bpy.types.PropertyGroup):
@@ -92,6 +92,84 @@ class PolisherSettings(bpy.types.PropertyGroup):
         update=ghosting.update_ghosts
     )
 
+    ghost_bake_mode: EnumProperty(
+        name="Bake Mode",
+        description="Which frames Bake Ghosts evaluates",
+        items=[
+            ('FULL', "Full Range", "Bake every frame of the scene range up front"),
+            ('WINDOW', "On Demand", "Bake only the frames the ghosts currently show, extending the window as the playhead moves"),
+        ],
+        default='FULL',
+        update=ghosting.update_ghosts
+    )
+    ghost_bake_scope: EnumProperty(
+        name="Bake Scope",
+        description="What gets evaluated for every baked frame",
+        items=[
+            ('SCENE', "Whole Scene", "Change the scene frame, evaluating everything in the scene"),
+            ('OBJECT', "Object Only", "Evaluate only the ghosted object and what it depends on "
+                                      "(rig, constraints, drivers), skipping the rest of the set"),
+        ],
+        default='SCENE'
+    )
+    ghost_bake_workers: IntProperty(
+        name="Bake Workers",
+        description="Background Blender processes used for full-range bakes (1 = bake inside this session). "
+                    "Falls back to the in-process bake if a worker fails",
+        default=1,
+        min=1,
+        max=64
+    )
+    ghost_disk_cache: BoolProperty(
+        name="Disk Cache",
+        description="Keep baked ghosts in a cache folder next to the .blend, reloaded when the file is opened. "
+                    "Only frames whose mesh or animation changed are re-baked",
+        default=False
+    )
+    ghost_memory_budget: IntProperty(
+        name="Memory Budget (MB)",
+        description="Maximum memory for baked ghosts. Least recently drawn frames are evicted beyond it "
+                    "and re-baked when needed again (0 = unlimited)",
+        default=2048,
+        min=0,
+        update=ghosting.update_memory_budget
+    )
+    ghost_compact: BoolProperty(
+        name="Compact Ghosts",
+        description="Store baked ghosts as 16-bit positions (quantized to each frame's bounds) "
+                    "and octahedral normals, halving vertex memory. Applies to newly baked frames",
+        default=False
+    )
+    ghost_lod_ratio: FloatProperty(
+        name="Ghost Detail",
+        description="Fraction of the vertices kept in baked ghosts. Below 1, a reduced proxy mesh is built "
+                    "once by vertex clustering and every frame only stores its proxy vertices. "
+                    "Applies to newly baked frames",
+        default=1.0,
+        min=0.01,
+        max=1.0,
+        subtype='FACTOR'
+    )
+    ghost_lod_keep_near: BoolProperty(
+        name="Full Detail Nearest",
+        description="Keep the nearest previous and next ghost at full detail when ghosts are reduced",
+        default=True,
+        update=ghosting.update_ghosts
+    )
+    ghost_instanced: BoolProperty(
+        name="Instanced Drawing",
+        description="Draw all ghosts of an object in a single instanced draw call, reading their shapes "
+                    "from one GPU texture. Keeps a CPU copy of each baked shape. Applies to newly baked "
+                    "frames, compact ghosts are still drawn one by one",
+        default=False,
+        update=ghosting.update_ghosts
+    )
+    auto_update_ghosts: BoolProperty(
+        name="Auto-Update Ghosts",
+        description="Re-bake only the ghost frames invalidated by a polish edit, shortly after the edit",
+        default=True
+    )
+
     ghost_prev_color: FloatVectorProperty(
         name="Prev Color",
         subtype='COLOR',
@@ -143,10 +221,24 @@ class PolisherSettings(bpy.types.PropertyGroup):
             ('SOLID', "Solid (Lit)", "Draw as 3D shaded solid"),
             ('SILHOUETTE', "Silhouette (Flat)", "Draw as flat silhouette"),
             ('WIRE', "Wireframe", "Draw as wireframe"),
+            ('TRAIL', "Motion Trail", "Bake only the tracked points and draw their path with a tick per frame"),
         ],
         default='SILHOUETTE',
         update=ghosting.update_ghosts
     )
+    trail_source: EnumProperty(
+        name="Trail Points",
+        description="Points followed by the motion trail",
+        items=[
+            ('SELECTED', "Selected Vertices", "One trail per selected vertex (up to 64)"),
+            ('GROUP', "Vertex Group", "One trail following the weighted centroid of a vertex group"),
+        ],
+        default='SELECTED'
+    )
+    trail_vertex_group: StringProperty(
+        name="Trail Group",
+        description="Vertex group whose centroid the motion trail follows"
+    )
     
     show_hud: BoolProperty(
         name="Show HUD",
@@ -181,11 +273,19 @@ def register():
             
     bpy.types.Object.animah_tracks = CollectionProperty(type=PolishTrack)
     bpy.types.Object.animah_active_track_index = IntProperty()
+    bpy.types.Object.animah_ghost_pinned = BoolProperty(
+        name="Pin Ghosts",
+        description="Keep baking and drawing this object's ghosts when it is not the active object",
+        default=False,
+        update=ghosting.update_pinned
+    )
     bpy.types.Scene.animah_settings = PointerProperty(type=PolisherSettings)
 
 def unregister():
     if hasattr(bpy.types.Scene, "animah_settings"):
         del bpy.types.Scene.animah_settings
+    if hasattr(bpy.types.Object, "animah_ghost_pinned"):
+        del bpy.types.Object.animah_ghost_pinned
     if hasattr(bpy.types.Object, "animah_active_track_index"):
         del bpy.types.Object.animah_active_track_index
     if hasattr(bpy.types.Object, "animah_tracks"):
@@ -1,157 +1,327 @@
 import bpy
+import bisect
 import gpu
 from gpu_extras.batch import batch_for_shader
+import numpy as np
+from . import animation_edits
+from . import ghosting
+from . import profiling
 
 _handle_dopesheet = None
-_handle_timeline = None
-_shader_2d = None
+_handle_graph = None
+_hud_shader = None
+# Last drawn HUD per region: { region pointer: {'key': ((index key, first item, end item), ...), 'batch'} }
+_hud_batches = {}
+# Frame-sorted HUD items per track: { (object pointer, track index): index }, see get_hud_index
+_hud_indices = {}
+# Bumped when item frames are reconciled with the keys. Together with the animation edit
+# revision it keys the HUD and frame indices
+_hud_revision = 0
 
-_shader_2d = None
+# HUD layout in pixels: one lane per track, stacked down from the top of the editor
+LANE_HEIGHT = 8
+LANE_GAP = 2
+STRIP_MARGIN = 2
+# Alpha factor of the lanes of the non-active tracks
+INACTIVE_ALPHA = 0.35
 
-def get_shader_2d():
-    global _shader_2d
-    if not _shader_2d:
-        _shader_2d = gpu.shader.from_builtin('UNIFORM_COLOR')
-    return _shader_2d
+def get_hud_shader():
+    global _hud_shader
+    if not _hud_shader:
+        _hud_shader = gpu.shader.from_builtin('SMOOTH_COLOR')
+    return _hud_shader
 
-def draw_timeline_markers():
-    """Draw a colored strip at the TOP of the Dope Sheet for polish frames.
-    Each keyframe marker uses its own custom color."""
-    context = bpy.context
+def build_hud_batch(lanes):
+    """One TRIS batch with the outer falloff and inner peak quad of every item of every lane,
+    colored per vertex.
     
-    if context.space_data.type != 'DOPESHEET_EDITOR':
-        return
+    `lanes` is [(frame_data, lane top, alpha factor)]. x is in frames and y in pixels
+    (0 is the top of the strip, lanes go down): only the view transform differs
+    between redraws, it is applied as a matrix when drawing.
+    """
+    frame_data = [data for lane, _, _ in lanes for data in lane]
+    lane_sizes = [len(lane) for lane, _, _ in lanes]
+    count = len(frame_data)
+    edges = np.array([(left, right, peak - 0.4, peak + 0.4) for left, peak, right, _ in frame_data],
+                     dtype=np.float32).reshape(-1, 2)
+    colors = np.array([color for *_, color in frame_data], dtype=np.float32)
+    colors[:, 3] *= np.repeat([alpha for _, _, alpha in lanes], lane_sizes)
+    tops = np.repeat(np.repeat(np.array([top for _, top, _ in lanes], dtype=np.float32), lane_sizes), 2)
+    
+    # Per item: outer quad then inner quad, drawn in that order like before
+    pos = np.empty((count * 2, 4, 2), dtype=np.float32)
+    pos[:, :, 0] = edges[:, [0, 0, 1, 1]]
+    pos[:, :, 1] = tops[:, None] + np.array([-LANE_HEIGHT, 0.0, -LANE_HEIGHT, 0.0], dtype=np.float32)
+    
+    quad_colors = np.repeat(colors, 2, axis=0)
+    quad_colors[0::2, 3] *= 0.25  # soft falloff alpha
+    quad_colors[1::2, 3] *= 0.9   # strong center alpha
+    
+    base = np.arange(count * 2, dtype=np.int32)[:, None] * 4
+    indices = (base + np.array([0, 1, 2, 1, 3, 2], dtype=np.int32)).reshape(-1, 3)
+    return batch_for_shader(get_hud_shader(), 'TRIS', {
+        "pos": pos.reshape(-1, 2),
+        "color": np.repeat(quad_colors, 4, axis=0),
+    }, indices=indices)
 
-    obj = context.active_object
-    if not obj or not hasattr(obj, "animah_tracks"):
-        return
+def get_hud_batch(region, lanes, active_index):
+    """The HUD batch of `region` for `lanes` [(track index, HUD index, first item, end item)].
+    
+    Rebuilt only when an index, a visible range or the active track changed.
+    """
+    key = (tuple((index['key'], start, end) for _, index, start, end in lanes), active_index)
+    cached = _hud_batches.get(region.as_pointer())
+    if cached is None or cached['key'] != key:
+        batch = build_hud_batch([
+            (index['frame_data'][start:end],
+             -track_index * (LANE_HEIGHT + LANE_GAP),
+             1.0 if track_index == active_index else INACTIVE_ALPHA)
+            for track_index, index, start, end in lanes
+        ])
+        cached = _hud_batches[region.as_pointer()] = {'key': key, 'batch': batch}
+    return cached['batch']
 
-    active_idx = obj.animah_active_track_index
-    if active_idx >= len(obj.animah_tracks):
-        return
+def get_hud_index(obj, track_index, track, neighbor_range):
+    """Items of `track` sorted by peak frame, for bisecting to the visible range.
+    
+    Returns {'key', 'peaks', 'frame_data', 'reach'}: `reach` is the widest distance from
+    a peak to its falloff edges. Rebuilt when an action or object was edited, the item
+    count or the neighbor range changed.
+    """
+    key = (obj.as_pointer(), track_index, len(track.items), neighbor_range,
+           animation_edits.revision(), _hud_revision)
+    index = _hud_indices.get(key[:2])
+    if index is None or index['key'] != key:
+        frame_data = sorted(compute_frame_data(obj, track, neighbor_range), key=lambda data: data[1])
+        index = _hud_indices[key[:2]] = {
+            'key': key,
+            'peaks': [peak for _, peak, _, _ in frame_data],
+            'frame_data': frame_data,
+            'reach': max((max(peak - left, right - peak) for left, peak, right, _ in frame_data), default=0),
+        }
+    return index
 
-    track = obj.animah_tracks[active_idx]
-    settings = context.scene.animah_settings
+def bump_hud_revision():
+    global _hud_revision
+    _hud_revision += 1
+
+# Shape key F-Curves per action: { action pointer: (action revision, { shape key name: fcurve }) }
+_fcurve_index = {}
+# Keyframe extents per shape key:
+# { (action pointer, shape key name): (action revision checked at, keyframe bytes, (left, peak, right)) }
+_extents = {}
+
+def shape_key_fcurves(action):
+    """{ shape key name: fcurve } for the shape key values animated in `action`"""
+    revision = animation_edits.action_revision(action)
+    cached = _fcurve_index.get(action.as_pointer())
+    if cached is None or cached[0] != revision:
+        index = {}
+        for fc in action.fcurves:
+            path = fc.data_path
+            if path.startswith('key_blocks["') and path.endswith('"].value'):
+                index[path[len('key_blocks["'):-len('"].value')]] = fc
+        cached = _fcurve_index[action.as_pointer()] = (revision, index)
+    return cached[1]
+
+def keyframe_extents(action, shape_key_name):
+    """(left, peak, right) frames around the highest key of the shape key F-Curve.
     
-    # Check if HUD is enabled
-    if not settings or not settings.show_hud:
-        return
+    left/right are None when the peak has no neighbor key on that side, the whole
+    result is None without an F-Curve or keys. Once the action is edited the keys are
+    compared with the cached ones, and the extents only recomputed if they changed.
+    """
+    key = (action.as_pointer(), shape_key_name)
+    revision = animation_edits.action_revision(action)
+    cached = _extents.get(key)
+    if cached is not None and cached[0] == revision:
+        return cached[2]
     
-    neighbor_range = settings.neighbor_range if settings else 4
+    fc = shape_key_fcurves(action).get(shape_key_name)
+    if fc is None:
+        _extents[key] = (revision, None, None)
+        return None
     
-    if not track.items:
-        return
+    co = animation_edits.keyframe_co(fc)
+    checksum = co.tobytes()
+    if cached is not None and cached[1] == checksum:
+        _extents[key] = (revision, checksum, cached[2])
+        return cached[2]
+    
+    extents = None
+    if len(co):
+        frames = co[:, 0].astype(np.int64)
+        order = np.argsort(frames, kind='stable')
+        frames = frames[order]
+        # First highest key in frame order
+        peak = int(np.argmax(co[order, 1]))
+        extents = (
+            int(frames[peak - 1]) if peak > 0 else None,
+            int(frames[peak]),
+            int(frames[peak + 1]) if peak < len(frames) - 1 else None,
+        )
+    _extents[key] = (revision, checksum, extents)
+    return extents
 
-    # Optimization: Cache the action lookup
+def compute_frame_data(obj, track, neighbor_range):
+    """Resolve the HUD extents of each item of `track` from its shape key F-Curve.
+    
+    Returns [(left_edge, peak_frame, right_edge, color)], one per item.
+    """
     action = None
     if obj.data and obj.data.shape_keys and obj.data.shape_keys.animation_data:
         action = obj.data.shape_keys.animation_data.action
 
-    # Collect frame data as (left_edge, peak, right_edge, color) tuples
     frame_data = []
-    
-    # Resolve real-time positions from F-Curves
     for item in track.items:
         peak_frame = item.frame
-        left_edge = peak_frame - neighbor_range
-        right_edge = peak_frame + neighbor_range
-        item_color = tuple(item.color)  # per-item color
+        left_edge = right_edge = None
         
-        if action and item.shape_key_name:
-            target_path = f'key_blocks["{item.shape_key_name}"].value'
-            
-            for fc in action.fcurves:
-                if fc.data_path == target_path:
-                    # Collect all keyframes with their values
-                    kp_list = [(int(kp.co[0]), kp.co[1]) for kp in fc.keyframe_points]
-                    kp_list.sort(key=lambda x: x[0])  # Sort by frame
-                    
-                    # Find the peak (highest value)
-                    peak_idx = -1
-                    peak_val = -1.0
-                    for i, (frame, val) in enumerate(kp_list):
-                        if val > peak_val:
-                            peak_val = val
-                            peak_idx = i
-                            peak_frame = frame
-                    
-                    # Find left edge (keyframe before peak with lower value)
-                    if peak_idx > 0:
-                        left_edge = kp_list[peak_idx - 1][0]
-                    else:
-                        left_edge = peak_frame - neighbor_range
-                    
-                    # Find right edge (keyframe after peak with lower value)
-                    if peak_idx < len(kp_list) - 1:
-                        right_edge = kp_list[peak_idx + 1][0]
-                    else:
-                        right_edge = peak_frame + neighbor_range
-                    
-                    break
+        extents = keyframe_extents(action, item.shape_key_name) if action and item.shape_key_name else None
+        if extents is not None:
+            left_edge, peak_frame, right_edge = extents
         
-        frame_data.append((left_edge, peak_frame, right_edge, item_color))
+        # No neighbor key on a side -> fall back to the neighbor range
+        if left_edge is None:
+            left_edge = peak_frame - neighbor_range
+        if right_edge is None:
+            right_edge = peak_frame + neighbor_range
         
-    if not frame_data:
+        frame_data.append((left_edge, peak_frame, right_edge, tuple(item.color)))
+    return frame_data
+
+@profiling.timed("draw_timeline_markers")
+def draw_timeline_markers():
+    """Draw one lane per polish track at the TOP of the Dope Sheet / Graph Editor.
+    Each keyframe marker uses its own custom color, the active track's lane is the strongest."""
+    context = bpy.context
+    space = context.space_data
+    
+    if space.type not in {'DOPESHEET_EDITOR', 'GRAPH_EDITOR'}:
+        return
+    # The drivers editor has no frames on its x axis
+    if space.type == 'GRAPH_EDITOR' and space.mode == 'DRIVERS':
+        return
+
+    obj = context.active_object
+    if not obj or not getattr(obj, "animah_tracks", None):
         return
+
+    settings = context.scene.animah_settings
+    
+    # Check if HUD is enabled
+    if not settings or not settings.show_hud:
+        return
+    
+    neighbor_range = settings.neighbor_range
         
     region = context.region
     view2d = region.view2d
+    view_start, _ = view2d.region_to_view(0, 0)
+    view_end, _ = view2d.region_to_view(region.width, 0)
     
-    # HUD Settings - Fixed strip at the TOP of the editor
-    strip_height = 8   # Height in pixels
-    strip_margin = 2   # Margin from top edge
+    # Only the items whose falloff can reach the visible frames
+    lanes = []
+    for track_index, track in enumerate(obj.animah_tracks):
+        if not track.items:
+            continue
+        index = get_hud_index(obj, track_index, track, neighbor_range)
+        start = bisect.bisect_left(index['peaks'], view_start - index['reach'])
+        end = bisect.bisect_right(index['peaks'], view_end + index['reach'])
+        if start < end:
+            lanes.append((track_index, index, start, end))
+    if not lanes:
+        return
     
-    y_max = region.height - strip_margin
-    y_min = y_max - strip_height
+    batch = get_hud_batch(region, lanes, obj.animah_active_track_index)
     
-    shader = get_shader_2d()
-    gpu.state.blend_set('ALPHA')
-    shader.bind()
+    # The batch is in (frame, pixels below the strip top) units: map it onto the region
+    x0, _ = view2d.view_to_region(0.0, 0.0, clip=False)
+    x1, _ = view2d.view_to_region(1.0, 0.0, clip=False)
     
-    # Draw each item with its own color
-    for left_edge, peak_frame, right_edge, item_color in frame_data:
-        # 1. Outer Falloff (Based on actual keyframe positions)
-        xl_out, _ = view2d.view_to_region(left_edge, 0)
-        xr_out, _ = view2d.view_to_region(right_edge, 0)
-        
-        # Skip if completely off-screen
-        if xr_out < 0 or xl_out > region.width:
-            continue
-        
-        # Outer box (softer)
-        outer_verts = [
-            (xl_out, y_min), (xl_out, y_max),
-            (xr_out, y_min), (xr_out, y_max)
-        ]
-        outer_indices = [(0, 1, 2), (1, 3, 2)]
-        
-        c = list(item_color)
-        c[3] *= 0.25  # soft falloff alpha
-        shader.uniform_float("color", tuple(c))
-        batch_out = batch_for_shader(shader, 'TRIS', {"pos": outer_verts}, indices=outer_indices)
-        batch_out.draw(shader)
-        
-        # 2. Inner Center (Narrow highlight at peak)
-        framewidth_l, _ = view2d.view_to_region(peak_frame - 0.4, 0)
-        framewidth_r, _ = view2d.view_to_region(peak_frame + 0.4, 0)
-        
-        inner_verts = [
-            (framewidth_l, y_min), (framewidth_l, y_max),
-            (framewidth_r, y_min), (framewidth_r, y_max)
-        ]
-        inner_indices = [(0, 1, 2), (1, 3, 2)]
-        
-        c = list(item_color)
-        c[3] *= 0.9  # strong center alpha
-        shader.uniform_float("color", tuple(c))
-        batch_in = batch_for_shader(shader, 'TRIS', {"pos": inner_verts}, indices=inner_indices)
-        batch_in.draw(shader)
-
+    shader = get_hud_shader()
+    gpu.state.blend_set('ALPHA')
+    gpu.matrix.push()
+    gpu.matrix.translate((x0, region.height - STRIP_MARGIN))
+    gpu.matrix.scale((x1 - x0, 1.0))
+    batch.draw(shader)
+    gpu.matrix.pop()
     gpu.state.blend_set('NONE')
 
+# Item frames sorted per track: { (object pointer, track index): {'key', 'frames', 'items'} }
+_frame_indices = {}
+# { object pointer: (action pointer, action revision) } the item frames were last reconciled with,
+# they are only reconciled again once the action is edited
+_reconciled = {}
+# Set between render_init and render_complete/render_cancel
+_rendering = False
+
+def reconcile_item_frames(obj, action):
+    """Move the items of every track to the first significant key of their shape key,
+    in case the user moved keys in the Dope Sheet. Returns True if any item moved."""
+    fcurves = shape_key_fcurves(action)
+    moved = False
+    for track in obj.animah_tracks:
+        for item in track.items:
+            fcurve = fcurves.get(item.shape_key_name) if item.shape_key_name else None
+            if fcurve is None:
+                continue
+            co = animation_edits.keyframe_co(fcurve)
+            # Find the "Peak" keyframe (value close to 1.0)
+            significant = np.flatnonzero(co[:, 1] > 0.5)
+            if len(significant):
+                peak_frame = int(co[significant[0], 0])
+                if peak_frame != item.frame:
+                    item.frame = peak_frame
+                    moved = True
+    return moved
+
+def get_frame_index(obj, track_index, track):
+    """Item frames of `track` sorted by (frame, item index), for bisecting to the closest item"""
+    key = (obj.as_pointer(), track_index, len(track.items), animation_edits.revision(), _hud_revision)
+    index = _frame_indices.get(key[:2])
+    if index is None or index['key'] != key:
+        frames = np.empty(len(track.items), dtype=np.int32)
+        track.items.foreach_get("frame", frames)
+        order = np.argsort(frames, kind='stable')
+        index = _frame_indices[key[:2]] = {
+            'key': key,
+            'frames': frames[order].tolist(),
+            'items': order.tolist(),
+        }
+    return index
+
+def closest_item(index, frame):
+    """Index of the item closest to `frame`, the lowest item index on ties"""
+    frames = index['frames']
+    after = bisect.bisect_left(frames, frame)
+    candidates = []
+    if after < len(frames):
+        candidates.append(after)
+    if after > 0:
+        # First item on the frame right before
+        candidates.append(bisect.bisect_left(frames, frames[after - 1]))
+    return min((abs(frames[i] - frame), index['items'][i]) for i in candidates)[1]
+
+def is_animation_playing():
+    screen = bpy.context.screen
+    if screen is not None:
+        return screen.is_animation_playing
+    return any(window.screen.is_animation_playing for window in bpy.context.window_manager.windows)
+
 @bpy.app.handlers.persistent
+@profiling.timed("sync_list_to_timeline")
 def sync_list_to_timeline(scene, depsgraph=None):
-    """Auto-highlight the item in the list that is closest to current frame"""
+    """Auto-highlight the item in the list that is closest to current frame.
+    
+    Skipped while rendering and during playback (caught up once playback stops).
+    """
+    if _rendering or is_animation_playing():
+        return
+    # Frames set by a ghost bake (possibly on its temporary scene) are not the user's
+    if scene != bpy.context.scene or ghosting.is_baking():
+        return
+    
     # Safety checks
     obj = bpy.context.active_object
     if not obj or not getattr(obj, "animah_tracks", None):
@@ -166,93 +336,181 @@ def sync_list_to_timeline(scene, depsgraph=None):
         
     current_frame = scene.frame_current
     
-    # 1. Update item frames from actual F-Curves (in case user moved keys in Dope Sheet)
-    # This ensures consistency
-    if obj.data and obj.data.shape_keys and obj.data.shape_keys.animation_data and obj.data.shape_keys.animation_data.action:
+    # 1. Update item frames from actual F-Curves, only once the shape key action changed
+    action = None
+    if obj.data and obj.data.shape_keys and obj.data.shape_keys.animation_data:
         action = obj.data.shape_keys.animation_data.action
-        # Cache fcurves lookup? action.fcurves.find is decent.
-        
-        for t in obj.animah_tracks:
-            for item in t.items:
-                sk_name = item.shape_key_name
-                if not sk_name: 
-                    continue
-                    
-                data_path = f'key_blocks["{sk_name}"].value'
-                fcurve = action.fcurves.find(data_path)
-                
-                if fcurve:
-                    # Find the "Peak" keyframe (value close to 1.0)
-                    # Optimization: Likely checking just the keypoints is fast enough for typical counts
-                    peak_frame = None
-                    for kp in fcurve.keyframe_points:
-                        if kp.co[1] > 0.5: # Assuming peak is significant
-                            peak_frame = int(kp.co[0])
-                            break
-                    
-                    if peak_frame is not None and peak_frame != item.frame:
-                        item.frame = peak_frame
+    if action:
+        state = (action.as_pointer(), animation_edits.action_revision(action))
+        if _reconciled.get(obj.as_pointer()) != state:
+            _reconciled[obj.as_pointer()] = state
+            if reconcile_item_frames(obj, action):
+                bump_hud_revision()
     
     # Find closest item
-    closest_idx = -1
-
-    min_dist = float('inf')
-    
-    for i, item in enumerate(track.items):
-        dist = abs(item.frame - current_frame)
-        if dist < min_dist:
-            min_dist = dist
-            closest_idx = i
+    closest_idx = closest_item(get_frame_index(obj, obj.animah_active_track_index, track), current_frame)
             
     # Update UI if needed
-    if closest_idx != -1 and closest_idx != track.active_item_index:
+    if closest_idx != track.active_item_index:
         # Lock preventing the update callback from jumping the timeline back
         if hasattr(scene, "animah_settings") and scene.animah_settings:
             scene.animah_settings.is_scrubbing = True
             track.active_item_index = closest_idx
             scene.animah_settings.is_scrubbing = False
 
+@bpy.app.handlers.persistent
+def sync_after_playback(scene, depsgraph=None):
+    """Catch up with the frame playback stopped on"""
+    sync_list_to_timeline(scene)
+
+@bpy.app.handlers.persistent
+def pause_sync_for_render(*args):
+    global _rendering
+    _rendering = True
 
 @bpy.app.handlers.persistent
+def resume_sync_after_render(*args):
+    global _rendering
+    _rendering = False
+
+@bpy.app.handlers.persistent
+def reset_caches(*args):
+    """A loaded file may reuse the pointers the HUD and list caches are keyed on"""
+    global _pending_redraw, _last_signature
+    # File loads also remove the (non persistent) redraw timer
+    _pending_redraw = _last_signature = None
+    _hud_batches.clear()
+    _hud_indices.clear()
+    _fcurve_index.clear()
+    _extents.clear()
+    _frame_indices.clear()
+    _reconciled.clear()
+
+
+# Seconds the HUD redraw waits for more updates, a burst of updates redraws once
+REDRAW_DELAY = 0.05
+# Pending redraw: 'FORCE' (keys changed) or 'CHECK' (compare hud_signature first), None when idle
+_pending_redraw = None
+_last_signature = None
+
+def hud_signature(context):
+    """What the HUD shows besides the keys: settings, tracks, item frames and colors"""
+    obj = context.active_object
+    settings = context.scene.animah_settings
+    if not obj or not getattr(obj, "animah_tracks", None):
+        return (settings.show_hud,)
+    tracks = []
+    for track in obj.animah_tracks:
+        frames = np.empty(len(track.items), dtype=np.int32)
+        track.items.foreach_get("frame", frames)
+        colors = np.empty(len(track.items) * 4, dtype=np.float32)
+        track.items.foreach_get("color", colors)
+        tracks.append(frames.tobytes() + colors.tobytes())
+    return (settings.show_hud, settings.neighbor_range, obj.as_pointer(), obj.animah_active_track_index, tuple(tracks))
+
+def _redraw_timer():
+    global _pending_redraw, _last_signature
+    context = bpy.context
+    signature = hud_signature(context)
+    if _pending_redraw == 'FORCE' or signature != _last_signature:
+        for window in context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type in {'DOPESHEET_EDITOR', 'GRAPH_EDITOR'}:
+                    area.tag_redraw()
+    _last_signature = signature
+    _pending_redraw = None
+    return None
+
+@bpy.app.handlers.persistent
+@profiling.timed("force_dopesheet_redraw")
 def force_dopesheet_redraw(scene, depsgraph=None):
-    """Force dopesheet to redraw after any scene change"""
-    for window in bpy.context.window_manager.windows:
-        for area in window.screen.areas:
-            if area.type == 'DOPESHEET_EDITOR':
-                area.tag_redraw()
+    """Redraw the editors showing the HUD once the active object's shape keys, their
+    action or the Animah properties changed. Debounced by REDRAW_DELAY."""
+    global _pending_redraw
+    # The timer is gone after a file load (or if it failed), a leftover 'FORCE' must not block redraws
+    scheduled = bpy.app.timers.is_registered(_redraw_timer)
+    if depsgraph is None or (scheduled and _pending_redraw == 'FORCE'):
+        return
+    obj = bpy.context.active_object
+    if not obj or obj.type != 'MESH':
+        return
+    key = obj.data.shape_keys
+    action = key.animation_data.action if key and key.animation_data else None
+    
+    pending = _pending_redraw if scheduled else None
+    for update in depsgraph.updates:
+        datablock = update.id.original
+        if datablock == key or (action and datablock == action):
+            pending = 'FORCE'
+            break
+        # Object and scene updates also come from sculpting and transforms: only
+        # redraw if the HUD signature changed
+        if datablock == obj or datablock == scene:
+            pending = 'CHECK'
+    
+    if pending is not None and not scheduled:
+        bpy.app.timers.register(_redraw_timer, first_interval=REDRAW_DELAY)
+    _pending_redraw = pending
+
+def sync_pause_handlers():
+    """(handler, handler list) pairs pausing the list sync during renders and catching up after playback"""
+    pairs = [
+        (pause_sync_for_render, bpy.app.handlers.render_init),
+        (resume_sync_after_render, bpy.app.handlers.render_complete),
+        (resume_sync_after_render, bpy.app.handlers.render_cancel),
+    ]
+    # Blender 4.2+
+    if hasattr(bpy.app.handlers, "animation_playback_post"):
+        pairs.append((sync_after_playback, bpy.app.handlers.animation_playback_post))
+    return pairs
 
 def register():
-    global _handle_dopesheet, _handle_timeline
+    global _handle_dopesheet, _handle_graph
     
     # Register sync handler
     if sync_list_to_timeline not in bpy.app.handlers.frame_change_post:
         bpy.app.handlers.frame_change_post.append(sync_list_to_timeline)
+    for handler, handlers in sync_pause_handlers():
+        if handler not in handlers:
+            handlers.append(handler)
     
-    # Register depsgraph handler for forced refresh after edits
+    # Register depsgraph handler for HUD redraws after edits
     if force_dopesheet_redraw not in bpy.app.handlers.depsgraph_update_post:
         bpy.app.handlers.depsgraph_update_post.append(force_dopesheet_redraw)
+    if reset_caches not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(reset_caches)
 
     if _handle_dopesheet is None:
         _handle_dopesheet = bpy.types.SpaceDopeSheetEditor.draw_handler_add(draw_timeline_markers, (), 'WINDOW', 'POST_PIXEL')
         
-    if _handle_timeline is None:
-        # Timeline is technically SpaceGraphEditor? No SpaceTimeline?
-        # Actually SpaceDopeSheetEditor covers Action Editor, Dope Sheet.
-        # Logic Editor -> Timeline is separate?
-        # Blender 4.0: Timeline is just a Dopesheet mode usually? No handle separate?
-        # Actually `SpaceTimeline` exists but often we use DopeSheet for seeing keys.
-        # Let's add to SpaceGraphEditor (F-Curves) too?
-        # Let's stick to Dopesheet for now.
-        pass
+    if _handle_graph is None:
+        _handle_graph = bpy.types.SpaceGraphEditor.draw_handler_add(draw_timeline_markers, (), 'WINDOW', 'POST_PIXEL')
 
 def unregister():
-    global _handle_dopesheet
+    global _handle_dopesheet, _handle_graph, _pending_redraw, _last_signature
+    _pending_redraw = _last_signature = None
+    _hud_batches.clear()
+    _hud_indices.clear()
     if _handle_dopesheet is not None:
         bpy.types.SpaceDopeSheetEditor.draw_handler_remove(_handle_dopesheet, 'WINDOW')
         _handle_dopesheet = None
+    if _handle_graph is not None:
+        bpy.types.SpaceGraphEditor.draw_handler_remove(_handle_graph, 'WINDOW')
+        _handle_graph = None
         
     if sync_list_to_timeline in bpy.app.handlers.frame_change_post:
         bpy.app.handlers.frame_change_post.remove(sync_list_to_timeline)
+    for handler, handlers in sync_pause_handlers():
+        if handler in handlers:
+            handlers.remove(handler)
+    _frame_indices.clear()
+    _reconciled.clear()
     
     if force_dopesheet_redraw in bpy.app.handlers.depsgraph_update_post:
         bpy.app.handlers.depsgraph_update_post.remove(force_dopesheet_redraw)
+    if reset_caches in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(reset_caches)
+    if bpy.app.timers.is_registered(_redraw_timer):
+        bpy.app.timers.unregister(_redraw_timer)
+    _extents.clear()
+    _fcurve_index.clear()
@@ -80,7 +80,40 @@ class ANIMAH_PT_main(bpy.types.Panel):
         if settings.show_ghosts:
             row = box.row()
             row.scale_y = 1.2
-            row.operator("animah.bake_ghosts", icon='RENDER_STILL', text="Bake Ghosts to GPU")
+            row.prop(settings, "ghost_bake_mode", text="")
+            row.prop(settings, "ghost_bake_scope", text="")
+            row.prop(obj, "animah_ghost_pinned", text="", icon='PINNED' if obj.animah_ghost_pinned else 'UNPINNED')
+            row = box.row(align=True)
+            row.prop(settings, "ghost_disk_cache")
+            if settings.ghost_bake_mode == 'FULL':
+                row.prop(settings, "ghost_bake_workers")
+            from . import ghosting
+            progress = ghosting.bake_progress()
+            if progress is None:
+                row.operator("animah.bake_ghosts", icon='RENDER_STILL', text="Bake Ghosts to GPU")
+            else:
+                done, total = progress
+                row.progress(factor=done / max(total, 1), type='BAR', text=f"Baking {done} / {total} (Esc to cancel)")
+            
+            row = box.row(align=True)
+            row.prop(settings, "ghost_memory_budget")
+            row.prop(settings, "ghost_compact", text="", icon='MOD_DECIM')
+            row.prop(settings, "ghost_instanced", text="", icon='MOD_INSTANCE')
+            used_mb = ghosting.cache_size_bytes() / (1024 * 1024)
+            row.label(text=f"{used_mb:.0f} MB used")
+            
+            row = box.row(align=True)
+            row.prop(settings, "ghost_lod_ratio", slider=True)
+            if settings.ghost_lod_ratio < 1.0:
+                row.prop(settings, "ghost_lod_keep_near", text="", icon='MESH_UVSPHERE')
+            
+            trail = settings.ghost_display_type == 'TRAIL'
+            stale = len(ghosting.GHOST_TRAIL_DIRTY) if trail else len(ghosting.GHOST_DIRTY)
+            row = box.row(align=True)
+            row.prop(settings, "auto_update_ghosts")
+            if stale:
+                op = row.operator("animah.bake_ghosts", icon='FILE_REFRESH', text=f"Update {stale} Stale")
+                op.only_dirty = True
             
             row = box.row()
             row.prop(settings, "ghost_type")
@@ -91,6 +124,12 @@ class ANIMAH_PT_main(bpy.types.Panel):
                 row.prop(settings, "ghost_step")
             row.prop(settings, "ghost_length", text="Length" if settings.ghost_type == 'STEP' else "Keyframes")
             
+            if settings.ghost_display_type == 'TRAIL':
+                row = box.row(align=True)
+                row.prop(settings, "trail_source", text="")
+                if settings.trail_source == 'GROUP':
+                    row.prop_search(settings, "trail_vertex_group", obj, "vertex_groups", text="")
+            
             row = box.row()
             row.prop(settings, "ghost_prev_color", text="")
             row.prop(settings, "ghost_next_color", text="")
@@ -117,10 +156,47 @@ class ANIMAH_PT_main(bpy.types.Panel):
             col = row.column(align=True)
             col.operator("animah.remove_polish_item", icon='REMOVE', text="")
 
+class ANIMAH_PT_profiling(bpy.types.Panel):
+    bl_label = "Profiling"
+    bl_idname = "ANIMAH_PT_profiling"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = 'Animah'
+    bl_parent_id = "ANIMAH_PT_main"
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    def draw(self, context):
+        from . import profiling
+        layout = self.layout
+        enabled = profiling.is_enabled()
+        
+        row = layout.row(align=True)
+        row.operator("animah.toggle_profiling", text="Recording" if enabled else "Record Timings",
+                     icon='REC' if enabled else 'TIME', depress=enabled)
+        row.operator("animah.reset_profiling", text="", icon='TRASH')
+        row.operator("animah.export_profiling", text="", icon='EXPORT')
+        
+        stats = profiling.stats()
+        if not stats:
+            layout.label(text="No timings recorded")
+            return
+            
+        col = layout.column(align=True)
+        row = col.row()
+        row.label(text="")
+        row.label(text="Avg ms")
+        row.label(text="P95 ms")
+        for name, s in stats.items():
+            row = col.row()
+            row.label(text=name)
+            row.label(text=f"{s['avg_ms']:.2f}")
+            row.label(text=f"{s['p95_ms']:.2f}")
+
 classes = (
     ANIMAH_UL_track_list,
     ANIMAH_UL_item_list,
     ANIMAH_PT_main,
+    ANIMAH_PT_profiling,
 )
 
 def register():